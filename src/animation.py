@@ -1,35 +1,76 @@
 import json
 import os
+import time
 from manim import Scene, Arrow, Text, VGroup, MathTex, Write, Create, FadeIn, FadeOut, ReplacementTransform, UP, DOWN, RIGHT
 from typing import List, Tuple
 import numpy as np
 
-# --- load the configuration ---
-_cfg_path = os.path.join(os.path.dirname(__file__), "animation_data.json")
-try:
-    with open(_cfg_path) as _f:
-        _cfg = json.load(_f)
-    
-    # unpack
-    _inputs  = [(w, np.array(v)) for w, v      in _cfg["inputs"]]
-    _ops     = _cfg["ops"]
-    _result  = (_cfg["result"][0], np.array(_cfg["result"][1]))
-    _similars= [(w, np.array(v), s) for w, v, s in _cfg["similars"]]
-except FileNotFoundError:
-    # Default data for testing if JSON file doesn't exist
-    _inputs = [("king", np.array([1.0, 0.5, 0.3])), ("man", np.array([0.9, 0.45, 0.25])), ("woman", np.array([1.1, 0.55, 0.35]))]
-    _ops = ["sub", "add"]
-    _result = ("queen", np.array([1.2, 0.6, 0.45]))
-    _similars = [("princess", np.array([1.15, 0.58, 0.42]), 0.99), ("monarchy", np.array([1.05, 0.52, 0.38]), 0.96)]
-
-class VectorOpsScene(Scene):
+# Render jobs pass their own data file through this environment variable so that
+# concurrent renders never share one configuration file
+DATA_ENV_VAR = "ANIMATION_DATA"
+# Set by run_animations when tracing: launch time of this manim process, and where to
+# report how long the process took to reach the first scene
+LAUNCHED_AT_ENV_VAR = "ANIMATION_LAUNCHED_AT"
+STARTUP_FILE_ENV_VAR = "ANIMATION_STARTUP_FILE"
+_default_cfg_path = os.path.join(os.path.dirname(__file__), "animation_data.json")
+
+def parse_animation_data(cfg):
+    """Unpack the JSON data written by run_animations into (inputs, ops, result, similars)"""
+    inputs  = [(w, np.array(v)) for w, v      in cfg["inputs"]]
+    ops     = cfg["ops"]
+    result  = (cfg["result"][0], np.array(cfg["result"][1]))
+    similars= [(w, np.array(v), s) for w, v, s in cfg["similars"]]
+    return inputs, ops, result, similars
+
+def load_animation_data(path=None):
+    """
+    Load (inputs, ops, result, similars) for the scenes.
+
+    Reads `path`, else the file named by $ANIMATION_DATA, else animation_data.json beside
+    this module, falling back to built-in sample data if none exists.
+    """
+    path = path or os.environ.get(DATA_ENV_VAR) or _default_cfg_path
+    try:
+        with open(path) as f:
+            cfg = json.load(f)
+        inputs, ops, result, similars = parse_animation_data(cfg)
+    except FileNotFoundError:
+        # Default data for testing if JSON file doesn't exist
+        inputs = [("king", np.array([1.0, 0.5, 0.3])), ("man", np.array([0.9, 0.45, 0.25])), ("woman", np.array([1.1, 0.55, 0.35]))]
+        ops = ["sub", "add"]
+        result = ("queen", np.array([1.2, 0.6, 0.45]))
+        similars = [("princess", np.array([1.15, 0.58, 0.42]), 0.99), ("monarchy", np.array([1.05, 0.52, 0.38]), 0.96)]
+    return inputs, ops, result, similars
+
+class DataScene(Scene):
+    """
+    Base for scenes driven by animation data.
+
+    A persistent render worker passes the data in directly; a manim command-line
+    render leaves it unset and the data is loaded from file instead.
+    """
+    def __init__(self, data=None, **kwargs):
+        super().__init__(**kwargs)
+        self.data = data
+        if os.environ.get(STARTUP_FILE_ENV_VAR) and os.environ.get(LAUNCHED_AT_ENV_VAR):
+            startup = time.time() - float(os.environ[LAUNCHED_AT_ENV_VAR])
+            with open(os.environ[STARTUP_FILE_ENV_VAR], "w") as f:
+                json.dump({"startup_ms": startup * 1000}, f)
+
+    def animation_data(self):
+        if self.data is not None:
+            return parse_animation_data(self.data)
+        return load_animation_data()
+
+class VectorOpsScene(DataScene):
     """
     A Manim scene to visualize vector operations (addition and subtraction) on word embeddings.
     """
     def construct(self):
+        _inputs, _ops, _, _ = self.animation_data()
         origin = np.array([-4, 0, 0])
         
-        # Reduce to 2D for visualization and pad with zeros for 3D compatibility
+        # Vectors arrive as 2D projections (see projection.py); pad with zeros for 3D compatibility
         vectors = [np.append(v[:2], 0) for _, v in _inputs]
         words = [w for w, _ in _inputs]
         
@@ -81,14 +122,15 @@ class VectorOpsScene(Scene):
         self.wait(2)
 
 
-class SimilarityScene(Scene):
+class SimilarityScene(DataScene):
     """
     A Manim scene to visualize cosine similarity between a result vector and similar word vectors.
     """
     def construct(self):
+        _, _, _result, _similars = self.animation_data()
         # Unpack result and similars
         result_word, result_vector = _result
-        result_vector = np.append(result_vector[:2], 0)  # Reduce to 2D and pad with 0 for 3D compatibility
+        result_vector = np.append(result_vector[:2], 0)  # 2D projection, padded with 0 for 3D compatibility
         similars = [(w, np.append(v[:2], 0), s) for w, v, s in _similars]
 
         # Result vector on the left
@@ -0,0 +1,170 @@
+import argparse
+import os
+from typing import List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import cache_dir, cache_path, cache_stamp, load_static_embeddings, temp_path
+from search import ExactSearch, SearchEngine, top_k
+
+# Rows are scored in blocks of this size when assigning them to lists
+_ASSIGN_BLOCK = 65536
+
+
+def _unit_rows(embeddings: "KeyedVectors", rows) -> np.ndarray:
+    embeddings.fill_norms()
+    block = np.asarray(embeddings.vectors[rows], dtype=np.float32)
+    norms = embeddings.norms[rows]
+    return block / np.where(norms > 0, norms, 1)[:, None]
+
+
+class IVFIndex(SearchEngine):
+    """
+    Inverted-file approximate nearest-neighbour index in pure NumPy.
+
+    Rows are partitioned by spherical k-means into `n_lists` lists. A query scores the
+    centroids, then only the rows of its `n_probe` closest lists, so each search touches
+    roughly ``n_probe / n_lists`` of the matrix. Raising `n_probe` trades speed for recall.
+    """
+
+    def __init__(self, embeddings: "KeyedVectors", centroids: np.ndarray, order: np.ndarray,
+                 offsets: np.ndarray, n_probe: int = 8, target_recall: Optional[float] = None):
+        super().__init__(embeddings)
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.n_probe = n_probe
+        # The recall `n_probe` was calibrated for, if any
+        self.target_recall = target_recall
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings: "KeyedVectors", n_lists: Optional[int] = None, n_iter: int = 10,
+              sample_size: Optional[int] = None, seed: int = 0) -> "IVFIndex":
+        """Train the coarse quantizer on a sample of rows and assign every row to a list."""
+        count = len(embeddings.vectors)
+        n_lists = n_lists or max(1, int(np.sqrt(count)))
+        sample_size = min(count, sample_size or 40 * n_lists)
+        rng = np.random.default_rng(seed)
+
+        sample = _unit_rows(embeddings, np.sort(rng.choice(count, sample_size, replace=False)))
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            # keep the previous centroid for lists that received no rows
+            empty = norms == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1
+            centroids = sums / norms[:, None]
+
+        assign = np.empty(count, dtype=np.int32)
+        for start in range(0, count, _ASSIGN_BLOCK):
+            end = min(count, start + _ASSIGN_BLOCK)
+            assign[start:end] = np.argmax(_unit_rows(embeddings, slice(start, end)) @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return cls(embeddings, centroids.astype(np.float32), order, offsets)
+
+    def save(self, path, stamp: str = ""):
+        tmp_path = temp_path(path)
+        np.savez(tmp_path, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                 n_probe=np.int64(self.n_probe), target_recall=np.float64(self.target_recall or np.nan),
+                 stamp=np.array(stamp))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, embeddings: "KeyedVectors", path, stamp: Optional[str] = None) -> "IVFIndex":
+        """Load a saved index; raises `ValueError` if it was built from other vectors than `stamp`"""
+        with np.load(path) as data:
+            if len(data["order"]) != len(embeddings.vectors):
+                raise ValueError(f"Index {path} does not match the loaded embeddings")
+            if stamp is not None and ("stamp" not in data.files or str(data["stamp"]) != stamp):
+                raise ValueError(f"Index {path} was built from a different embeddings file")
+            target_recall = float(data["target_recall"]) if "target_recall" in data.files else np.nan
+            return cls(embeddings, data["centroids"], data["order"], data["offsets"], int(data["n_probe"]),
+                       None if np.isnan(target_recall) else target_recall)
+
+    def search(self, query, topn, exclude=(), full=False):
+        n_probe = min(self.n_probe, self.n_lists)
+        lists = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        candidates = np.sort(np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]))
+        self.embeddings.fill_norms()
+        scores = (self.embeddings.vectors[candidates] @ query) / self.embeddings.norms[candidates]
+        skip = np.flatnonzero(np.isin(candidates, list(exclude)))
+        best, best_scores = top_k(scores, topn, skip)
+        return candidates[best], best_scores
+
+    def recall(self, queries: List[List[str]], topn: int = 5) -> float:
+        """Mean recall@topn of this index against exact search for positive-only queries."""
+        exact = ExactSearch(self.embeddings)
+        hits = 0
+        for words in queries:
+            expected = {w for w, _ in exact.most_similar(positive=words, topn=topn)}
+            found = {w for w, _ in self.most_similar(positive=words, topn=topn)}
+            hits += len(expected & found)
+        return hits / (topn * len(queries)) if queries else 1.0
+
+    def calibrate(self, target_recall: float = 0.95, topn: int = 5, n_queries: int = 200,
+                  seed: int = 0) -> float:
+        """Double `n_probe` from 1 until recall@topn on sampled frequent words reaches `target_recall`."""
+        rng = np.random.default_rng(seed)
+        pool = min(len(self.embeddings.index_to_key), 50000)
+        queries = [[self.embeddings.index_to_key[i]] for i in rng.choice(pool, min(pool, n_queries), replace=False)]
+        self.target_recall = target_recall
+        self.n_probe = 1
+        while True:
+            recall = self.recall(queries, topn)
+            if recall >= target_recall or self.n_probe >= self.n_lists:
+                return recall
+            self.n_probe = min(self.n_lists, self.n_probe * 2)
+
+
+def load_ivf_index(embeddings: "KeyedVectors", file_path, target_recall: float = 0.95, rebuild=False,
+                   variant: Optional[str] = None) -> IVFIndex:
+    """
+    Return the IVF index persisted next to `file_path`, building and calibrating it on
+    first use, when the embeddings file has changed, or when `rebuild` is set. An index
+    calibrated for a different `target_recall` is only re-calibrated. `variant` tags the
+    file of an index over a restricted vocabulary (see `vocabulary_variant`).
+    """
+    path = cache_path(file_path, "ivf.npz", variant)
+    stamp = cache_stamp(file_path)
+    index = None
+    if not rebuild and os.path.exists(path):
+        try:
+            index = IVFIndex.load(embeddings, path, stamp)
+            if index.target_recall == target_recall:
+                return index
+        except Exception:
+            # Stale or damaged (e.g. a half-written file from an older version)
+            index = None
+    if index is None:
+        index = IVFIndex.build(embeddings)
+    index.calibrate(target_recall)
+    os.makedirs(cache_dir(file_path), exist_ok=True)
+    index.save(path, stamp)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the IVF approximate nearest-neighbour index.")
+    parser.add_argument("file_path")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    embeddings = load_static_embeddings(args.file_path, binary=not args.text, no_header=args.no_header)
+    index = load_ivf_index(embeddings, args.file_path, args.target_recall, rebuild=True)
+    print(f"{index.n_lists} lists, n_probe={index.n_probe}")
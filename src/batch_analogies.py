@@ -0,0 +1,126 @@
+import argparse
+import json
+import time
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from gensim.models import KeyedVectors
+
+from embeddings_loader import load_static_embeddings
+from expressions import OPERATORS, parse_input, split_terms
+from search import query_matrix
+
+# Default ceiling for the (queries x vocabulary) score block, in megabytes
+DEFAULT_MAX_MEMORY_MB = 512
+# Each cell of the score block costs its float32 score plus the int64 position
+# argpartition returns for it
+_BYTES_PER_CELL = 4 + 8
+
+
+def read_expressions(path) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Yield (expression, expected answer or None) from an analogy file.
+
+    Lines look like ``king - man + woman`` or ``king - man + woman = queen``. Lines with
+    four plain words are read in the Google analogy format ``a b c d``, meaning
+    ``b - a + c = d``. Blank lines and lines starting with ``#`` or ``:`` are skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in "#:":
+                continue
+            expression, _, expected = line.partition("=")
+            tokens = parse_input(expression)
+            if not expected and len(tokens) == 4 and not any(t in OPERATORS for t in tokens):
+                a, b, c, d = tokens
+                yield f"{b} - {a} + {c}", d.lower()
+            else:
+                yield expression.strip(), expected.strip().lower() or None
+
+
+def evaluate_analogies(
+    embeddings: KeyedVectors,
+    questions: Iterable[Tuple[str, Optional[str]]],
+    output_path,
+    topn: int = 5,
+    block_size: Optional[int] = None,
+    max_memory_mb: int = DEFAULT_MAX_MEMORY_MB,
+) -> dict:
+    """
+    Answer analogy questions in blocks and stream one JSON line per question to disk.
+
+    Each block of queries is scored against the whole vocabulary with one matrix
+    multiply, using the same cosine semantics as `KeyedVectors.most_similar` and
+    excluding the input words. `block_size` defaults to the largest block whose score
+    matrix, and the top-k selection over it, fit in `max_memory_mb`. Returns accuracy counts for questions with an answer.
+    """
+    embeddings.fill_norms()
+    vocab_size = len(embeddings.vectors)
+    block_size = block_size or max(1, (max_memory_mb * 1024 * 1024) // (_BYTES_PER_CELL * vocab_size))
+    summary = {"questions": 0, "answered": 0, "skipped": 0, "correct_top1": 0, "correct_topn": 0}
+    start = time.perf_counter()
+
+    def flush(block, out):
+        queries, rows, cols = query_matrix(embeddings, [terms for _, _, terms in block])
+        scores = queries @ embeddings.vectors.T
+        scores /= embeddings.norms
+        scores[rows, cols] = -np.inf
+        k = min(topn, vocab_size - 1)
+        # Partition for the k highest scores directly; negating would copy the block
+        best = np.argpartition(scores, min(vocab_size - k, vocab_size - 1), axis=1)[:, vocab_size - k:]
+        best = np.take_along_axis(best, np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1), axis=1)
+        for row, (expression, expected, _) in enumerate(block):
+            results = [[embeddings.index_to_key[i], float(scores[row, i])] for i in best[row]]
+            record = {"expression": expression, "results": results}
+            if expected is not None:
+                words = [w for w, _ in results]
+                record["expected"] = expected
+                record["correct"] = bool(words) and words[0] == expected
+                summary["answered"] += 1
+                summary["correct_top1"] += record["correct"]
+                summary["correct_topn"] += expected in words
+            out.write(json.dumps(record) + "\n")
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        block = []
+        for expression, expected in questions:
+            summary["questions"] += 1
+            positives, negatives = split_terms(parse_input(expression))
+            missing = [w for w in positives + negatives if w not in embeddings.key_to_index]
+            if missing or not positives + negatives:
+                summary["skipped"] += 1
+                out.write(json.dumps({"expression": expression, "skipped": True, "missing": missing}) + "\n")
+                continue
+            block.append((expression, expected, (positives, negatives)))
+            if len(block) == block_size:
+                flush(block, out)
+                block = []
+        if block:
+            flush(block, out)
+
+    answered = max(1, summary["answered"])
+    summary["accuracy_top1"] = summary["correct_top1"] / answered
+    summary[f"accuracy_top{topn}"] = summary["correct_topn"] / answered
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a file of word analogies in vectorized batches.")
+    parser.add_argument("questions", help="file of expressions, one per line")
+    parser.add_argument("output", help="JSON lines file for per-question results")
+    parser.add_argument("--embeddings", default="embeddings/dolma_300_2024_1.2M.100_combined.txt")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--topn", type=int, default=5)
+    parser.add_argument("--block-size", type=int, default=None)
+    parser.add_argument("--max-memory-mb", type=int, default=DEFAULT_MAX_MEMORY_MB)
+    args = parser.parse_args()
+
+    embeddings = load_static_embeddings(args.embeddings, binary=not args.text, no_header=args.no_header)
+    summary = evaluate_analogies(
+        embeddings, read_expressions(args.questions), args.output,
+        topn=args.topn, block_size=args.block_size, max_memory_mb=args.max_memory_mb,
+    )
+    print(json.dumps(summary, indent=2))
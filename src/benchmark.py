@@ -0,0 +1,186 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+
+from embeddings_loader import cache_dir, load_static_embeddings
+from expressions import determine_operations, parse_input, split_terms
+from projection import Projection
+from search import ExactSearch, run_query
+
+
+def generate_synthetic_embeddings(path, vocab_size: int, dim: int, seed: int = 0):
+    """Write a headerless word2vec text file of random vectors, like the Dolma file"""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, vocab_size, 10000):
+            block = rng.standard_normal((min(10000, vocab_size - start), dim)).astype(np.float32)
+            for i, row in enumerate(block):
+                f.write(f"w{start + i} " + " ".join(f"{x:.5f}" for x in row) + "\n")
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _load_in_child(path, use_cache, results):
+    # Import gensim before the clock starts so only loading is timed
+    import gensim.models  # noqa: F401
+
+    start = time.perf_counter()
+    embeddings = load_static_embeddings(path, binary=False, no_header=True, use_cache=use_cache)
+    # Touch the vectors the way the first query does
+    embeddings.fill_norms()
+    results.put({"seconds": time.perf_counter() - start, "peak_rss_mb": _peak_rss_mb()})
+
+
+def measure_load(path, use_cache: bool = True, timeout: float = 3600.0) -> dict:
+    """
+    Time `load_static_embeddings` and record peak RSS, in a fresh process. Raises
+    `RuntimeError` if the child dies without reporting or takes longer than `timeout`.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_load_in_child, args=(path, use_cache, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                result = results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"Loading {path} failed: child exited with code {process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Loading {path} took longer than {timeout:.0f}s")
+    finally:
+        if process.is_alive() and time.monotonic() > deadline:
+            process.terminate()
+        process.join()
+    return result
+
+
+def _percentiles(samples: List[float]) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def random_expressions(embeddings, n: int, seed: int = 0) -> List[str]:
+    """A mix of single-word and 'a - b + c' queries over the vocabulary"""
+    rng = np.random.default_rng(seed)
+    words = embeddings.index_to_key
+    expressions = []
+    for i in range(n):
+        a, b, c = (words[j] for j in rng.choice(len(words), 3, replace=False))
+        expressions.append(a if i % 2 else f"{a} - {b} + {c}")
+    return expressions
+
+
+def measure_queries(embeddings, expressions: List[str], topn: int = 5) -> dict:
+    """Latency and throughput of calculate_similar_words-style queries"""
+    engine = ExactSearch(embeddings)
+    samples = []
+    start = time.perf_counter()
+    for expression in expressions:
+        query_start = time.perf_counter()
+        tokens = parse_input(expression)
+        positives, negatives = split_terms(tokens)
+        run_query(engine, positives, negatives, topn=topn)
+        determine_operations(tokens)
+        samples.append(time.perf_counter() - query_start)
+    total = time.perf_counter() - start
+    return {**_percentiles(samples), "queries": len(expressions), "throughput_qps": len(expressions) / total}
+
+
+def measure_render(embeddings, quality: str) -> dict:
+    """Wall time of one uncached `run_animations` call at a manim quality level"""
+    from run_animations import run_animations
+
+    projection = Projection.fit(embeddings)
+    words = embeddings.index_to_key
+    inputs = [(w, projection.project(embeddings[w])) for w in words[:3]]
+    result = ("Result", inputs[0][1] - inputs[1][1] + inputs[2][1])
+    similars = [(w, projection.project(embeddings[w]), 0.5) for w in words[3:8]]
+    start = time.perf_counter()
+    ok = run_animations(inputs, ["sub", "add"], result, similars, quality=quality, preview=False, use_cache=False)
+    return {"quality": quality, "seconds": time.perf_counter() - start, "ok": ok}
+
+
+def run_benchmarks(sizes: List[int], dims: List[int], n_queries: int, qualities: List[str], workdir) -> dict:
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "load": [],
+        "query": [],
+        "render": [],
+    }
+    embeddings = None
+    for vocab_size in sizes:
+        for dim in dims:
+            path = os.path.join(workdir, f"synthetic_{vocab_size}x{dim}.txt")
+            generate_synthetic_embeddings(path, vocab_size, dim)
+            shutil.rmtree(cache_dir(path), ignore_errors=True)
+            case = {"vocab_size": vocab_size, "dim": dim}
+            report["load"].append({**case, "mode": "text", **measure_load(path, use_cache=False)})
+            report["load"].append({**case, "mode": "cold_cache", **measure_load(path)})
+            report["load"].append({**case, "mode": "warm_cache", **measure_load(path)})
+
+            embeddings = load_static_embeddings(path, binary=False, no_header=True)
+            expressions = random_expressions(embeddings, n_queries)
+            report["query"].append({**case, **measure_queries(embeddings, expressions)})
+            print(f"{vocab_size} x {dim}: done", file=sys.stderr)
+
+    if qualities and embeddings is not None:
+        if shutil.which("manim") is None:
+            report["render"].append({"skipped": "manim not installed"})
+        else:
+            for quality in qualities:
+                report["render"].append(measure_render(embeddings, quality))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading, querying and rendering on synthetic embeddings.")
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated vocabulary sizes")
+    parser.add_argument("--dims", default="50,300", help="comma-separated vector dimensions")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--qualities", default="l,m,h", help="manim quality levels to time; empty to skip")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--workdir", default=None, help="where synthetic files go (default: a temp dir)")
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",")]
+    dims = [int(x) for x in args.dims.split(",")]
+    qualities = [q for q in args.qualities.split(",") if q]
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        report = run_benchmarks(sizes, dims, args.queries, qualities, args.workdir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="embeddings-bench-") as workdir:
+            report = run_benchmarks(sizes, dims, args.queries, qualities, workdir)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
@@ -1,12 +1,297 @@
-from gensim.models import KeyedVectors
+import hashlib
+import json
+import os
+import uuid
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
 
+import numpy as np
 
-def load_static_embeddings(file_path, binary=True, no_header=False) -> KeyedVectors:
+from instrumentation import count, span
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+CACHE_VERSION = 2
+
+# Progress callbacks receive (bytes processed, bytes total) about this often, in lines
+PROGRESS_EVERY = 10000
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def cache_dir(file_path) -> str:
+    """Directory holding the binary cache files that belong to an embeddings file."""
+    return f"{file_path}.cache"
+
+
+def cache_path(file_path, name, variant: Optional[str] = None) -> str:
+    """
+    Path of a single cache file (e.g. ``vectors.npy``) for an embeddings file. Files
+    derived from a restricted vocabulary carry its `variant` before the extension
+    (``int8.limit5000.npy``) so they never collide with those of the full file.
+    """
+    if variant:
+        stem, ext = os.path.splitext(name)
+        name = f"{stem}.{variant}{ext}"
+    return os.path.join(cache_dir(file_path), name)
+
+
+def temp_path(path) -> str:
+    """
+    A name private to this process to write `path` under before renaming it into place
+    with `os.replace`, so readers never see a half-written file. The extension is kept,
+    since `np.save` and `np.savez` add theirs otherwise.
+    """
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{os.getpid()}.{uuid.uuid4().hex}.tmp{ext}"
+
+
+def vocabulary_variant(limit: Optional[int] = None, allow_list: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Cache file tag for a vocabulary restriction (see `load_static_embeddings`):
+    ``limit5000``, ``allow<hash of the word set>``, both joined by ``-``, or None
+    for the full vocabulary.
+    """
+    parts = []
+    if limit is not None:
+        parts.append(f"limit{limit}")
+    if allow_list is not None:
+        words = "\n".join(sorted(set(allow_list))).encode("utf-8")
+        parts.append(f"allow{hashlib.sha1(words).hexdigest()[:12]}")
+    return "-".join(parts) or None
+
+
+def source_fingerprint(file_path) -> dict:
+    """Size and mtime of the source file, used to detect stale caches."""
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def cache_stamp(file_path) -> str:
+    """
+    Identity of the vectors that derived indexes are built from, as a JSON string: the
+    source fingerprint and parse flags of the cache (just the fingerprint without one).
+    Indexes store it and are rebuilt when it changes.
+    """
     try:
-        # Load pre-trained embeddings
-        embeddings = KeyedVectors.load_word2vec_format(
-            file_path, binary=binary, no_header=no_header
+        with open(cache_path(file_path, "meta.json")) as f:
+            meta = json.load(f)
+        stamp = {key: meta.get(key) for key in ("version", "source", "binary", "no_header")}
+    except (FileNotFoundError, json.JSONDecodeError):
+        stamp = {"source": source_fingerprint(file_path)}
+    return json.dumps(stamp, sort_keys=True)
+
+
+def _cache_is_fresh(file_path, binary, no_header) -> bool:
+    try:
+        with open(cache_path(file_path, "meta.json")) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return (
+        meta.get("version") == CACHE_VERSION
+        and meta.get("source") == source_fingerprint(file_path)
+        and meta.get("binary") == binary
+        and meta.get("no_header") == no_header
+        and all(os.path.exists(cache_path(file_path, name)) for name in ("vectors.npy", "norms.npy", "vocab.txt"))
+    )
+
+
+def _scan_text_file(file_path, no_header, progress: Optional[ProgressCallback] = None, total=0):
+    """Return (count, dim) of a word2vec text file without keeping any vectors."""
+    with open(file_path, "rb") as f:
+        if not no_header:
+            count, dim = (int(x) for x in f.readline().split())
+            return count, dim
+        count = 0
+        dim = None
+        done = 0
+        for line in f:
+            done += len(line)
+            if not line.strip():
+                continue
+            if dim is None:
+                dim = len(line.rstrip().split(b" ")) - 1
+            count += 1
+            if progress is not None and count % PROGRESS_EVERY == 0:
+                progress(done, total)
+        return count, dim
+
+
+def build_embeddings_cache(file_path, binary=True, no_header=False, progress: Optional[ProgressCallback] = None):
+    """
+    Convert a word2vec-format file into the binary cache read by `load_static_embeddings`.
+
+    The cache is a raw float32 ``vectors.npy`` matrix, precomputed ``norms.npy``, a
+    ``vocab.txt`` with one word per row and a ``meta.json`` recording the source file's
+    size and mtime and the parse flags. Text files are streamed row by row into the
+    memory-mapped output, so the conversion never holds more than one copy of the matrix.
+
+    Every file is written under a name private to this process and renamed into place,
+    so processes building the same cache at once do not corrupt each other's output;
+    ``meta.json`` goes last, once the rest of the cache is complete.
+
+    `progress`, if given, is called with (bytes processed, bytes total) while the text
+    is read; headerless files are read twice, so their total is twice the file size.
+    """
+    from gensim.models import KeyedVectors
+
+    # A missing source fails here, before an empty cache directory is left behind
+    size = os.path.getsize(file_path)
+    total = size
+    os.makedirs(cache_dir(file_path), exist_ok=True)
+    try:
+        os.remove(cache_path(file_path, "meta.json"))
+    except FileNotFoundError:
+        pass
+    suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    vectors_tmp = cache_path(file_path, f"vectors{suffix}.npy")
+
+    if binary:
+        # gensim's binary reader is already fast; just dump what it produces
+        kv = KeyedVectors.load_word2vec_format(file_path, binary=True, no_header=no_header)
+        words = kv.index_to_key
+        np.save(vectors_tmp, kv.vectors.astype(np.float32, copy=False), allow_pickle=False)
+        os.replace(vectors_tmp, cache_path(file_path, "vectors.npy"))
+    else:
+        total = 2 * size if no_header else size
+        count, dim = _scan_text_file(file_path, no_header, progress, total)
+        done = total - size
+        vectors = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(count, dim))
+        words = []
+        with open(file_path, "rb") as f:
+            if not no_header:
+                done += len(f.readline())
+            row = 0
+            for raw in f:
+                done += len(raw)
+                line = raw.decode("utf-8", errors="replace")
+                parts = line.rstrip().split(" ")
+                if len(parts) <= dim:
+                    continue
+                # words may themselves contain spaces; the last `dim` fields are the vector
+                words.append(" ".join(parts[:-dim]))
+                vectors[row] = np.asarray(parts[-dim:], dtype=np.float32)
+                row += 1
+                if progress is not None and row % PROGRESS_EVERY == 0:
+                    progress(done, total)
+                if row == count:
+                    break
+        vectors.flush()
+        del vectors
+        os.replace(vectors_tmp, cache_path(file_path, "vectors.npy"))
+
+    vectors = np.load(cache_path(file_path, "vectors.npy"), mmap_mode="r")
+    norms_tmp = cache_path(file_path, f"norms{suffix}.npy")
+    np.save(norms_tmp, np.linalg.norm(vectors, axis=1).astype(np.float32))
+    os.replace(norms_tmp, cache_path(file_path, "norms.npy"))
+    vocab_tmp = cache_path(file_path, f"vocab{suffix}")
+    with open(vocab_tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(words))
+        f.write("\n")
+    os.replace(vocab_tmp, cache_path(file_path, "vocab.txt"))
+    meta_tmp = cache_path(file_path, f"meta{suffix}")
+    with open(meta_tmp, "w") as f:
+        json.dump(
+            {
+                "version": CACHE_VERSION,
+                "source": source_fingerprint(file_path),
+                "binary": binary,
+                "no_header": no_header,
+                "count": int(vectors.shape[0]),
+                "dim": int(vectors.shape[1]),
+            },
+            f,
         )
+    os.replace(meta_tmp, cache_path(file_path, "meta.json"))
+    if progress is not None:
+        progress(total, total)
+
+
+def _vocabulary_rows(words, limit: Optional[int] = None, allow_list: Optional[Iterable[str]] = None):
+    """
+    Rows to keep from a frequency-ordered vocabulary: the first `limit` words, further
+    narrowed to those in `allow_list`. Returns a slice or an index array, in row order.
+    """
+    end = len(words) if limit is None else min(limit, len(words))
+    if allow_list is None:
+        return slice(0, end)
+    allowed = set(allow_list)
+    return np.fromiter((i for i in range(end) if words[i] in allowed), dtype=np.int64)
+
+
+def _make_keyed_vectors(vectors, words, norms=None) -> "KeyedVectors":
+    from gensim.models import KeyedVectors
+
+    embeddings = KeyedVectors(vectors.shape[1], count=0)
+    embeddings.vectors = vectors
+    embeddings.index_to_key = words
+    embeddings.key_to_index = {word: i for i, word in enumerate(words)}
+    embeddings.next_index = len(words)
+    embeddings.norms = norms
+    return embeddings
+
+
+def load_cached_embeddings(file_path, limit: Optional[int] = None,
+                           allow_list: Optional[Iterable[str]] = None) -> "KeyedVectors":
+    """
+    Open a previously built cache, memory-mapping the vector matrix read-only.
+
+    `limit` keeps only the first rows, which stay memory-mapped; `allow_list` keeps
+    only the listed words (in file order), copying just their rows into memory.
+    """
+    vectors = np.load(cache_path(file_path, "vectors.npy"), mmap_mode="r")
+    with open(cache_path(file_path, "vocab.txt"), encoding="utf-8") as f:
+        words = f.read().split("\n")[: vectors.shape[0]]
+    norms = np.load(cache_path(file_path, "norms.npy"), mmap_mode="r")
+
+    rows = _vocabulary_rows(words, limit, allow_list)
+    if isinstance(rows, slice):
+        words = words[rows]
+    else:
+        words = [words[i] for i in rows]
+    return _make_keyed_vectors(vectors[rows], words, np.array(norms[rows]))
+
+
+def load_static_embeddings(file_path, binary=True, no_header=False, use_cache=True,
+                           progress: Optional[ProgressCallback] = None, limit: Optional[int] = None,
+                           allow_list: Optional[Iterable[str]] = None) -> "KeyedVectors":
+    """
+    Load word2vec-format embeddings.
+
+    With `use_cache` the file is converted once into a binary cache next to it (see
+    `build_embeddings_cache`); later calls memory-map that cache instead of parsing the
+    file again, so startup is near-instant and concurrent processes share the vectors
+    through the OS page cache. The cache is rebuilt whenever the source file's size or
+    mtime changes. `progress` is forwarded to `build_embeddings_cache`.
+
+    Rows are in frequency order, so `limit` keeps the `limit` most frequent words;
+    `allow_list` keeps only the given words. The cache always holds the full file.
+    """
+    from gensim.models import KeyedVectors
+
+    try:
+        if use_cache:
+            if not _cache_is_fresh(file_path, binary, no_header):
+                count("embeddings_cache.miss")
+                with span("load.build_cache", path=file_path) as timing:
+                    build_embeddings_cache(file_path, binary=binary, no_header=no_header, progress=progress)
+                    timing.set(bytes=os.path.getsize(file_path))
+            else:
+                count("embeddings_cache.hit")
+            with span("load.open_cache", path=file_path):
+                return load_cached_embeddings(file_path, limit, allow_list)
+
+        # Load pre-trained embeddings
+        with span("load.parse", path=file_path, bytes=os.path.getsize(file_path)):
+            embeddings = KeyedVectors.load_word2vec_format(
+                file_path, binary=binary, no_header=no_header, limit=limit
+            )
+        if allow_list is not None:
+            rows = _vocabulary_rows(embeddings.index_to_key, allow_list=allow_list)
+            embeddings = _make_keyed_vectors(
+                embeddings.vectors[rows], [embeddings.index_to_key[i] for i in rows]
+            )
         return embeddings
     except Exception as e:
         print(f"Error loading embeddings: {e}")
@@ -15,7 +300,7 @@ def load_static_embeddings(file_path, binary=True, no_header=False) -> KeyedVect
 
 # Example
 if __name__ == "__main__":
-    embeddings: KeyedVectors = load_static_embeddings(
+    embeddings = load_static_embeddings(
         "embeddings/dolma_300_2024_1.2M.100_combined.txt", binary=False, no_header=True
     )
     print("\nBefore similarity search\n")
@@ -0,0 +1,36 @@
+from typing import List, Tuple
+
+OPERATORS = ["+", "-", " "]
+
+
+def parse_input(input_text: str) -> List[str]:
+    """Split an expression such as 'king - man + woman' into word and operator tokens"""
+    return input_text.split()
+
+
+def split_terms(tokens: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Sort the words of a parsed expression into positive and negative terms.
+
+    A word directly after "-" is negative, every other word is positive; words are
+    lowercased to match the vocabulary.
+    """
+    positives = []
+    negatives = []
+    for order, token in enumerate(tokens):
+        if order > 0 and tokens[order - 1] == "-":
+            negatives.append(token.lower())
+        elif token not in OPERATORS:
+            positives.append(token.lower())
+    return positives, negatives
+
+
+def determine_operations(tokens: List[str]) -> List[str]:
+    """Determine the sequence of operations from parsed text"""
+    ops = []
+    for token in tokens:
+        if token == "+":
+            ops.append("add")
+        elif token == "-":
+            ops.append("sub")
+    return ops
@@ -1,14 +1,83 @@
 from tkinter import messagebox
-from customtkinter import CTk, CTkLabel, CTkEntry, CTkButton, CTkCanvas, set_appearance_mode, set_default_color_theme, CTkFont
-from gensim.models.keyedvectors import KeyedVectors
-from embeddings_loader import load_static_embeddings
-from run_animations import run_animations
+from customtkinter import CTk, CTkLabel, CTkEntry, CTkButton, CTkCanvas, CTkCheckBox, CTkOptionMenu, CTkProgressBar, set_appearance_mode, set_default_color_theme, CTkFont
+from model_registry import ModelRegistry, ModelSpec, read_model_specs, read_word_list
+from expressions import OPERATORS, determine_operations, parse_input, split_terms
+from instrumentation import span
+from projection import project_animation_data
+from query_cache import load_query_cache, make_entry, query_key, restore_entry
+from search import run_query
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 import math
+import os
+import queue
+import sys
+import threading
 import tkinter as tk
-import numpy as np
+
+# gensim, the search indexes and the animation pipeline are imported on first use so
+# the window appears before any heavy module is loaded
+if TYPE_CHECKING:
+    from gensim.models.keyedvectors import KeyedVectors
+
+EMBEDDINGS_PATH = 'embeddings/dolma_300_2024_1.2M.100_combined.txt'
+# "exact" scans every row like KeyedVectors.most_similar, "ann" the approximate IVF index,
+# "float16" / "int8" score on a quantized matrix and re-rank a shortlist in float32,
+# "sharded" splits exact search across row shards in a thread pool, "tiered" scans the
+# TIERED_HEAD_SIZE most frequent words and only reaches into the rest when needed
+SEARCH_MODE = os.environ.get("EMBEDDINGS_SEARCH_MODE", "exact")
+ANN_TARGET_RECALL = float(os.environ.get("EMBEDDINGS_ANN_RECALL", "0.95"))
+TIERED_HEAD_SIZE = int(os.environ.get("EMBEDDINGS_TIERED_HEAD_SIZE", "200000"))
+# Restrict the vocabulary to the N most frequent words and/or the words listed (one per
+# line) in an allow-list file; search indexes are then built for the restricted set
+VOCAB_LIMIT = int(os.environ["EMBEDDINGS_VOCAB_LIMIT"]) if os.environ.get("EMBEDDINGS_VOCAB_LIMIT") else None
+ALLOW_LIST_PATH = os.environ.get("EMBEDDINGS_ALLOW_LIST")
+# Models offered in the model menu: a JSON list of {"name", "path", "binary", "no_header",
+# "limit", "allow_list"} entries; without it only the Dolma file above is offered
+MODELS_PATH = os.environ.get("EMBEDDINGS_MODELS")
+# Models stay loaded after switching away until they would take more than this much RAM
+MODEL_BUDGET_MB = int(os.environ.get("EMBEDDINGS_MODEL_BUDGET_MB", "4096"))
+# A running query_server.py is used instead of loading the embeddings in process
+QUERY_SERVER_URL = os.environ.get("EMBEDDINGS_QUERY_SERVER", "http://127.0.0.1:8765")
+# Results of this many distinct queries are remembered across sessions
+QUERY_CACHE_SIZE = int(os.environ.get("EMBEDDINGS_QUERY_CACHE_SIZE", "1000"))
+# How often the Tk main loop checks for results from the background workers
+POLL_INTERVAL_MS = 30
+
+
+def model_specs():
+    """The models listed in $EMBEDDINGS_MODELS, or just the Dolma file"""
+    if MODELS_PATH:
+        return read_model_specs(MODELS_PATH)
+    allow_list = read_word_list(ALLOW_LIST_PATH) if ALLOW_LIST_PATH else None
+    return [ModelSpec("Dolma", EMBEDDINGS_PATH, binary=False, no_header=True, limit=VOCAB_LIMIT,
+                      allow_list=allow_list)]
+
+
+def display_refresh_rate(default=60):
+    """
+    Refresh rate of the display in Hz: $EMBEDDINGS_REFRESH_RATE if set, else what the
+    OS reports where Tk has no way to ask (Windows), else `default`
+    """
+    if os.environ.get("EMBEDDINGS_REFRESH_RATE"):
+        return float(os.environ["EMBEDDINGS_REFRESH_RATE"])
+    if sys.platform == "win32":
+        try:
+            import ctypes
+
+            hdc = ctypes.windll.user32.GetDC(0)
+            rate = ctypes.windll.gdi32.GetDeviceCaps(hdc, 116)  # VREFRESH
+            ctypes.windll.user32.ReleaseDC(0, hdc)
+            # 0 and 1 mean "hardware default"
+            if rate > 1:
+                return float(rate)
+        except (AttributeError, OSError):
+            pass
+    return default
+
 
 class WheelPicker(CTkCanvas):
-    def __init__(self, master, items=None, radius_ratio=0.3, **kwargs):
+    def __init__(self, master, items=None, radius_ratio=0.3, refresh_rate=None, **kwargs):
         super().__init__(master, **kwargs)
         self.items = items or []
         self.radius_ratio = radius_ratio  # Radius as a ratio of canvas size
@@ -19,116 +88,152 @@ class WheelPicker(CTkCanvas):
         self._velocity = 0.0
         self._is_dragging = False
         self._selected_index = 0
-        
+
+        # Frames are drawn at most once per display refresh; input and physics only
+        # update state and request a frame
+        self.frame_interval_ms = max(1, round(1000 / (refresh_rate or display_refresh_rate())))
+        self._frame_id = None
+        self._motion = None  # None, "momentum" or "snap"
+
+        # Layout values, recomputed only when the canvas is resized
+        self._center = None
+        self._radius = 80
+        self._base_font_size = 10
+        self._fonts = {}
+        self._item_angles = []
+        # Last font and colour set on each item, so unchanged options are not re-sent to Tk
+        self._item_styles = []
+
         # Bind mouse events
         self.bind("<ButtonPress-1>", self._on_press)
         self.bind("<B1-Motion>", self._on_drag)
         self.bind("<ButtonRelease-1>", self._on_release)
         self.bind("<Configure>", self._on_configure)  # Bind resize event
-        
-        # Animation variables
-        self._animation_id = None
-        
-        # Draw initial wheel
-        self.after(100, self._draw_wheel)  # Delay to ensure canvas is properly sized
+
+        self._create_items()
 
     def update_items(self, items):
         """Update the items displayed in the wheel"""
         self.items = items
         self.angle = 0.0
         self._selected_index = 0
-        self._draw_wheel()
+        self._motion = None
+        self._create_items()
+
+    def _create_items(self):
+        """Create one word and one score text item per entry; frames only move them"""
+        for tid in self.text_ids + self.score_ids:
+            self.delete(tid)
+        self.text_ids = [self.create_text(0, 0, text=word, anchor="center") for word, _ in self.items]
+        self.score_ids = [self.create_text(0, 0, text=f"{score}%", anchor="center") for _, score in self.items]
+        self._item_styles = [None] * len(self.items)
+
+        n = len(self.items)
+        self._item_angles = [2 * math.pi * i / n for i in range(n)]
+        self._request_frame()
 
     def _on_configure(self, event):
         """Handle canvas resize events"""
-        self._draw_wheel()
+        self._compute_layout(event.width, event.height)
+        self._item_styles = [None] * len(self.items)
+        self._request_frame()
+
+    def _compute_layout(self, width, height):
+        """Precompute the centre, radius and the font table for the current canvas size"""
+        if width <= 1 or height <= 1:  # Canvas not ready yet
+            self._center = None
+            return
+        min_dimension = min(width, height)
+        self._center = (width // 2, height // 2)
+        self._radius = max(50, int(min_dimension * self.radius_ratio))
+
+        # Adaptive base font size; items use integer sizes between half and full size
+        base_font_size = max(10, int(min_dimension / 20))
+        self._base_font_size = base_font_size
+        self._fonts = {}
+        for font_size in range(int(base_font_size * 0.5), base_font_size + 1):
+            score_font_size = max(8, font_size - 4)
+            self._fonts[font_size] = (
+                ("Arial", font_size, "bold"),
+                ("Arial", score_font_size),
+                max(8, int(font_size * 0.6)),  # Distance above center
+                max(8, int(score_font_size * 0.8)),  # Distance below center
+            )
 
     @property
     def radius(self):
-        """Calculate radius based on current canvas size"""
-        width = self.winfo_width()
-        height = self.winfo_height()
-        if width <= 1 or height <= 1:
-            return 80  # Default radius
-        # Use ratio of the smaller dimension to ensure the circle fits
-        min_dimension = min(width, height)
-        return max(50, int(min_dimension * self.radius_ratio))
+        """Radius for the current canvas size"""
+        return self._radius
 
-    def _draw_wheel(self):
-        """Draw the wheel with items positioned in a circle"""
-        # Clear previous items
-        for tid in self.text_ids + self.score_ids:
-            self.delete(tid)
-        self.text_ids.clear()
-        self.score_ids.clear()
+    def _request_frame(self):
+        """Schedule a redraw for the next frame unless one is already pending"""
+        if self._frame_id is None:
+            self._frame_id = self.after(self.frame_interval_ms, self._on_frame)
+
+    def _on_frame(self):
+        """Advance the momentum/snap animation by one frame and redraw"""
+        self._frame_id = None
+        # Physics constants were tuned for 60 FPS; scale them to the actual frame time
+        step = self.frame_interval_ms / 16.0
+        if self._motion == "momentum":
+            self._add_momentum(step)
+        elif self._motion == "snap":
+            self._snap_to_nearest(step)
+        self._draw_wheel()
+        if self._motion is not None:
+            self._request_frame()
 
+    def _draw_wheel(self):
+        """Position the existing items around the circle"""
         if not self.items:
             return
+        if self._center is None:
+            self._compute_layout(self.winfo_width(), self.winfo_height())
+            if self._center is None:
+                self.after(50, self._request_frame)
+                return
 
-        # Get canvas dimensions
-        width = self.winfo_width()
-        height = self.winfo_height()
-        if width <= 1 or height <= 1:  # Canvas not ready yet
-            self.after(50, self._draw_wheel)
-            return
-            
-        cx = width // 2
-        cy = height // 2
-        
-        n = len(self.items)
-        if n == 0:
-            return
+        cx, cy = self._center
+        radius = self._radius
+        two_pi = 2 * math.pi
 
         # Draw items around the circle
-        for i, (word, score) in enumerate(self.items):
-            theta = self.angle + 2 * math.pi * i / n
-            x = cx + self.radius * math.sin(theta)
-            y = cy - self.radius * math.cos(theta)
-            
+        for i, base_angle in enumerate(self._item_angles):
+            theta = self.angle + base_angle
+            x = cx + radius * math.sin(theta)
+            y = cy - radius * math.cos(theta)
+
             # Calculate distance from top center to determine opacity and size
-            distance_from_top = abs(theta % (2 * math.pi) - 0)
+            distance_from_top = theta % two_pi
             if distance_from_top > math.pi:
-                distance_from_top = 2 * math.pi - distance_from_top
-            
+                distance_from_top = two_pi - distance_from_top
+
             # Scale font size and opacity based on position
             scale = max(0.5, 1 - distance_from_top / math.pi)
-            
-            # Calculate adaptive font size based on canvas size and scale
-            min_dimension = min(width, height)
-            base_font_size = max(10, int(min_dimension / 20))  # Adaptive base font size
-            font_size = int(base_font_size * scale)
-            score_font_size = max(8, font_size - 4)
-            
-            # Calculate adaptive spacing based on font size
-            word_offset = max(8, int(font_size * 0.6))  # Distance above center
-            score_offset = max(8, int(score_font_size * 0.8))  # Distance below center
-            
+            font_size = int(self._base_font_size * scale)
+            word_font, score_font, word_offset, score_offset = self._fonts[font_size]
+
             # Determine color based on theme
             if scale > 0.8:  # Top item (selected)
                 text_color = "#1f538d"  # Highlighted color
                 self._selected_index = i
             else:
                 text_color = "#7a7a7a"  # Dimmed color
-            
-            # Draw word
-            tid = self.create_text(x, y - word_offset, text=word, 
-                                 font=("Arial", font_size, "bold"), 
-                                 fill=text_color, anchor="center")
-            self.text_ids.append(tid)
-            
-            # Draw score below word
-            sid = self.create_text(x, y + score_offset, text=f"{score}%", 
-                                 font=("Arial", score_font_size), 
-                                 fill=text_color, anchor="center")
-            self.score_ids.append(sid)
+
+            self.coords(self.text_ids[i], x, y - word_offset)
+            self.coords(self.score_ids[i], x, y + score_offset)
+            style = (font_size, text_color)
+            if self._item_styles[i] != style:
+                self.itemconfigure(self.text_ids[i], font=word_font, fill=text_color)
+                self.itemconfigure(self.score_ids[i], font=score_font, fill=text_color)
+                self._item_styles[i] = style
 
     def _on_press(self, event):
         """Handle mouse press - start dragging"""
         self._drag_start = (event.x, event.y)
         self._is_dragging = True
         self._velocity = 0.0
-        if self._animation_id:
-            self.after_cancel(self._animation_id)
+        self._motion = None
 
     def _on_drag(self, event):
         """Handle mouse drag - rotate the wheel"""
@@ -143,26 +248,26 @@ class WheelPicker(CTkCanvas):
         self._velocity = dx / 10.0  # Store velocity for momentum
         
         self._drag_start = (event.x, event.y)
-        self._draw_wheel()
+        self._request_frame()
 
     def _on_release(self, event):
         """Handle mouse release - add momentum and snapping"""
         self._is_dragging = False
-        self._add_momentum()
+        self._motion = "momentum"
+        self._request_frame()
 
-    def _add_momentum(self):
+    def _add_momentum(self, step=1.0):
         """Add momentum after drag release and snap to nearest item"""
         if abs(self._velocity) > 0.1:
-            self.angle += self._velocity
-            self._velocity *= 0.95  # Friction
-            self._draw_wheel()
-            self._animation_id = self.after(16, self._add_momentum)  # ~60 FPS
+            self.angle += self._velocity * step
+            self._velocity *= 0.95 ** step  # Friction
         else:
-            self._snap_to_nearest()
+            self._motion = "snap"
 
-    def _snap_to_nearest(self):
+    def _snap_to_nearest(self, step=1.0):
         """Snap to the nearest item position"""
         if not self.items:
+            self._motion = None
             return
             
         n = len(self.items)
@@ -172,9 +277,9 @@ class WheelPicker(CTkCanvas):
         # Smooth animation to target
         diff = target_angle - self.angle
         if abs(diff) > 0.01:
-            self.angle += diff * 0.2
-            self._draw_wheel()
-            self._animation_id = self.after(16, self._snap_to_nearest)
+            self.angle += diff * (1 - 0.8 ** step)
+        else:
+            self._motion = None
 
     def get_selected_item(self):
         """Get the currently selected item"""
@@ -183,38 +288,214 @@ class WheelPicker(CTkCanvas):
         return self.items[self._selected_index]
 
 class WordSimilarityApp:
-    def __init__(self, master):
+    def __init__(self, master, search_mode=SEARCH_MODE):
         self.master = master
         master.title("Do Math ON WORDS!")
         
         # Configure grid to be responsive
         master.grid_columnconfigure(0, weight=1)
-        master.grid_rowconfigure(3, weight=1)
+        master.grid_rowconfigure(4, weight=1)
 
         set_appearance_mode("system")
         set_default_color_theme("dark-blue")
 
-        self.embeddings: KeyedVectors = load_static_embeddings('embeddings/dolma_300_2024_1.2M.100_combined.txt', binary=False, no_header=True)
+        # Embeddings load in the background once the window is up
+        self.registry = ModelRegistry(model_specs(), MODEL_BUDGET_MB * 1024 * 1024)
+        self.model_name = self.registry.names()[0]
+        self.model = None
+        self.embeddings: "KeyedVectors" = None
+        self.search_engine = None
+        self.search_mode = None
+        self.prefix_index = None
+        self.projection = None
+        self.neighbours = None
+        self.query_cache = None
+        self.query_client = None
+        self._requested_search_mode = search_mode
 
         self.label = CTkLabel(master, text="Enter words and operations (e.g., 'king - man + woman') and put spaces between them:", justify="center")
         self.label.grid(row=0, column=0, columnspan=2, padx=20, pady=(20, 10), sticky="ew")
 
         self.text_input = CTkEntry(master, placeholder_text="king - man + woman", justify="center")
         self.text_input.grid(row=1, column=0, padx=(20, 10), pady=(10, 10), sticky="ew")
+        self.text_input.bind("<KeyRelease>", self._on_input_changed)
+        self.text_input.bind("<Tab>", self._accept_suggestion)
+        self._default_border_color = self.text_input.cget("border_color")
+        self._suggestions = []
 
-        self.find_button = CTkButton(master, text="Find Similar Words", command=self.find_similar_words)
+        self.find_button = CTkButton(master, text="Find Similar Words", command=self.find_similar_words, state="disabled")
         self.find_button.grid(row=1, column=1, padx=(0, 20), pady=(10, 10), sticky="e")
 
+        self.suggestion_label = CTkLabel(master, text="", justify="center", text_color="#7a7a7a")
+        self.suggestion_label.grid(row=2, column=0, columnspan=2, padx=20, pady=(0, 0), sticky="ew")
+
         self.results_label = CTkLabel(master, text="Top 5 Similar Words:", justify="center")
-        self.results_label.grid(row=2, column=0, columnspan=2, padx=20, pady=(10, 0), sticky="ew")
+        self.results_label.grid(row=3, column=0, columnspan=2, padx=20, pady=(10, 0), sticky="ew")
 
         # Create the wheel picker for displaying results
         self.wheel_picker = WheelPicker(master, items=[], width=400, height=300)
-        self.wheel_picker.grid(row=3, column=0, columnspan=2, padx=20, pady=(10, 20), sticky="nsew")
+        self.wheel_picker.grid(row=4, column=0, columnspan=2, padx=20, pady=(10, 0), sticky="nsew")
+
+        self.status_label = CTkLabel(master, text="", justify="center")
+        self.status_label.grid(row=5, column=0, columnspan=2, padx=20, pady=(5, 15), sticky="ew")
+
+        self.progress_bar = CTkProgressBar(master)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=6, column=0, columnspan=2, padx=20, pady=(0, 15), sticky="ew")
+
+        self.model_menu = CTkOptionMenu(master, values=self.registry.names(), command=self._on_model_selected,
+                                        state="disabled")
+        self.model_menu.set(self.model_name)
+        self.model_menu.grid(row=7, column=0, columnspan=2, padx=20, pady=(0, 15))
+
+        # Tiered search only reaches into the rare words when needed unless this is ticked
+        self.full_search_box = CTkCheckBox(master, text="Include rare words")
+        self.full_search_box.grid(row=8, column=0, columnspan=2, padx=20, pady=(0, 15))
+        self.full_search_box.grid_remove()
+
+        # Searches and renders run off the Tk thread; results come back through a queue
+        # that the main loop polls, tagged with the query that produced them
+        self._query_executor = ThreadPoolExecutor(max_workers=1)
+        self._render_executor = ThreadPoolExecutor(max_workers=1)
+        self._results = queue.Queue()
+        self._query_id = 0
+        self._render_cancel = None
+        self._poll_id = master.after(POLL_INTERVAL_MS, self._poll_results)
+        master.protocol("WM_DELETE_WINDOW", self.close)
 
         master.bind("<Configure>", self.update_font_size)
         self.update_font_size()
 
+        self._set_busy("Loading embeddings...")
+        self._query_executor.submit(self._load_worker, search_mode)
+
+    def _load_worker(self, search_mode):
+        """
+        Connect to a query server if one is running, else load the default model and its
+        search indexes on the worker thread, reporting progress
+        """
+        from query_server import QueryClient
+
+        client = QueryClient(QUERY_SERVER_URL)
+        health = client.health()
+        if health is not None:
+            from embeddings_loader import cache_path, cache_stamp
+            from vocab_index import PrefixIndex
+
+            # The server answers for the default model until another one is selected
+            spec = self.registry.specs[self.model_name]
+            self.query_client = client
+            # Its answers are kept apart and only reused while it serves the same vectors
+            server = {"stamp": health.get("stamp"), "vocabulary": health.get("vocabulary")}
+            self.query_cache = load_query_cache(spec.path, QUERY_CACHE_SIZE, "server", server)
+            try:
+                # Autocomplete still works from the prefix index cached for the file the
+                # server serves, if that is the default model's file as it is now
+                stamp = cache_stamp(spec.path)
+                if server["stamp"] == stamp:
+                    prefix_index = PrefixIndex.load(cache_path(spec.path, "prefix.npz"), stamp)
+                    if len(prefix_index) == server["vocabulary"]:
+                        self.prefix_index = prefix_index
+            except Exception:
+                # No usable prefix index; autocomplete stays off
+                pass
+            self._results.put(("loaded", None, None, None))
+            return
+
+        self._switch_worker(self.model_name, search_mode)
+
+    def _switch_worker(self, name, search_mode):
+        """Make `name` the active model on the worker thread and report the outcome"""
+        try:
+            self._activate_model(name, search_mode)
+        except Exception as e:
+            self._results.put(("load_error", None, str(e), None))
+            return
+        self._results.put(("loaded", None, None, None))
+
+    def _activate_model(self, name, search_mode):
+        """
+        Load a model through the registry (a no-op if it is resident) and point the search
+        at it. The search engine, indexes and query cache derived from a model are kept
+        in its `extras`, so switching back to a resident model is instant. They are only
+        stored once all of them were built, so a failed switch leaves nothing half-made.
+        """
+        from neighbour_table import load_neighbour_table
+        from projection import load_projection
+        from vocab_index import load_prefix_index
+
+        def progress(done, total):
+            self._results.put(("progress", None, (done, total), None))
+
+        # The active model is only evicted once the new one is ready to take over
+        model = self.registry.get(name, progress, evict=False)
+        spec, extras = model.spec, dict(model.extras)
+        if "query_cache" not in extras:
+            # A restricted vocabulary gets its own cache files, tagged with spec.variant
+            extras["query_cache"] = load_query_cache(spec.path, QUERY_CACHE_SIZE, spec.variant)
+            if not spec.restricted:
+                # Built offline with neighbour_table.py over the full vocabulary; single-word
+                # queries use it when present
+                extras["neighbours"] = load_neighbour_table(spec.path)
+            extras["prefix_index"] = load_prefix_index(model.embeddings, spec.path, spec.variant)
+            extras["projection"] = load_projection(model.embeddings, spec.path, variant=spec.variant)
+        if "engine" not in extras:
+            extras["engine"], extras["engine_mode"] = self._build_engine(model, search_mode), search_mode
+        model.extras.update(extras)
+
+        if self.query_client is not None:
+            # Save the server's answers before the model's own cache takes over
+            self.query_cache.close()
+        self.query_client = None
+        self.model = model
+        self.model_name = name
+        self.embeddings = model.embeddings
+        self.search_engine, self.search_mode = extras["engine"], extras["engine_mode"]
+        self.prefix_index = extras["prefix_index"]
+        self.projection = extras["projection"]
+        self.neighbours = extras.get("neighbours")
+        self.query_cache = extras["query_cache"]
+        self.registry.evict(keep=name)
+
+    def _build_engine(self, model, mode):
+        """
+        A search engine of the given mode over `model`'s embeddings: exact, sharded exact,
+        tiered exact, approximate IVF or quantized
+        """
+        from ann_index import load_ivf_index
+        from quantized import QUANTIZED_DTYPES, load_quantized_index
+        from search import ExactSearch
+        from sharded_search import ShardedSearch
+        from tiered_search import TieredSearch
+
+        embeddings, path, variant = model.embeddings, model.spec.path, model.spec.variant
+        if mode == "ann":
+            return load_ivf_index(embeddings, path, ANN_TARGET_RECALL, variant=variant)
+        if mode in QUANTIZED_DTYPES:
+            return load_quantized_index(embeddings, path, mode, variant)
+        if mode == "sharded":
+            return ShardedSearch(embeddings)
+        if mode == "tiered":
+            return TieredSearch(embeddings, TIERED_HEAD_SIZE)
+        if mode == "exact":
+            return ExactSearch(embeddings)
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    def _on_model_selected(self, name):
+        """Switch models in the background; queries wait until the new model is ready"""
+        if name == self.model_name and self.model is not None:
+            return
+        self._query_id += 1
+        if self._render_cancel is not None:
+            self._render_cancel.set()
+            self._render_cancel = None
+        self.find_button.configure(state="disabled")
+        self.model_menu.configure(state="disabled")
+        self.progress_bar.set(0)
+        self.progress_bar.grid()
+        self._set_busy(f"Loading {name}...")
+        self._query_executor.submit(self._switch_worker, name, self._requested_search_mode)
+
     def update_font_size(self, event=None):
         width = self.master.winfo_width()
         # Define a base font size and scale it with the window width
@@ -224,6 +505,41 @@ class WordSimilarityApp:
         self.text_input.configure(font=CTkFont(size=base_size))
         self.find_button.configure(font=CTkFont(size=base_size))
         self.results_label.configure(font=CTkFont(size=base_size))
+        self.suggestion_label.configure(font=CTkFont(size=base_size))
+        self.status_label.configure(font=CTkFont(size=base_size))
+
+    def _on_input_changed(self, event=None):
+        """Suggest completions for the word being typed and flag unknown words"""
+        if self.prefix_index is None:
+            return
+        text = self.parse_input(self.text_input.get())
+        positives, negatives = split_terms(text)
+        typing = text[-1].lower() if text and not self.text_input.get().endswith(" ") else None
+        # The word still being typed is only checked once it is followed by a space
+        unknown = [w for w in positives + negatives if w != typing and w not in self.prefix_index]
+
+        if typing and typing not in OPERATORS:
+            self._suggestions = self.prefix_index.complete(typing)
+        else:
+            self._suggestions = []
+
+        if unknown:
+            self.suggestion_label.configure(text=f"Not in vocabulary: {', '.join(unknown)}")
+            self.text_input.configure(border_color="#c0392b")
+        else:
+            self.suggestion_label.configure(text="   ".join(self._suggestions))
+            self.text_input.configure(border_color=self._default_border_color)
+
+    def _accept_suggestion(self, event=None):
+        """Replace the word being typed with the top suggestion"""
+        if not self._suggestions:
+            return None
+        current = self.text_input.get()
+        head = current[:len(current) - len(current.split()[-1])]
+        self.text_input.delete(0, "end")
+        self.text_input.insert(0, f"{head}{self._suggestions[0]} ")
+        self._on_input_changed()
+        return "break"
 
     def find_similar_words(self):
         user_input = self.text_input.get().strip()
@@ -231,87 +547,199 @@ class WordSimilarityApp:
             messagebox.showwarning("Input Error", "Please enter a valid input.")
             return
 
+        # A newer query supersedes whatever is still searching or rendering
+        self._query_id += 1
+        if self._render_cancel is not None:
+            self._render_cancel.set()
+            self._render_cancel = None
+        self._set_busy("Searching...")
+        full = bool(self.full_search_box.get())
+        self._query_executor.submit(self._query_worker, self._query_id, user_input, full)
+
+    def _query_worker(self, query_id, user_input, full=False):
+        """Run a search on the worker thread and post the outcome to the result queue"""
+        if query_id != self._query_id:
+            return  # superseded before it started
         try:
-            similar_words = self.calculate_similar_words(user_input)
-            self.display_results(similar_words)
+            similar_words = self.calculate_similar_words(user_input, full)
+            self._results.put(("results", query_id, similar_words, self.animation_data))
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            self._results.put(("error", query_id, e, None))
+
+    def _render_worker(self, query_id, animation_data, similar_words, cancel_event):
+        """Render the animations for a finished query unless it gets superseded"""
+        try:
+            self.launch_animations(animation_data, similar_words, cancel_event)
+        except Exception as e:
+            print(f"Error launching animations: {e}")
+        self._results.put(("rendered", query_id, None, None))
+
+    def _poll_results(self):
+        """Deliver background results to the UI; results of superseded queries are dropped"""
+        try:
+            while True:
+                kind, query_id, payload, animation_data = self._results.get_nowait()
+                if kind == "progress":
+                    done, total = payload
+                    self.progress_bar.set(done / total if total else 1)
+                    self.status_label.configure(text=f"Loading embeddings... {done * 100 // max(1, total)}%")
+                    continue
+                if kind == "loaded":
+                    self.progress_bar.grid_remove()
+                    if self.query_client is None and self.search_mode == "tiered":
+                        self.full_search_box.grid()
+                    else:
+                        self.full_search_box.grid_remove()
+                    self.find_button.configure(state="normal")
+                    self.model_menu.configure(state="normal")
+                    self.model_menu.set(self.model_name)
+                    self._set_busy(None)
+                    self._on_input_changed()
+                    continue
+                if kind == "load_error":
+                    self.progress_bar.grid_remove()
+                    if self.model is not None or self.query_client is not None:
+                        # The previous model is still active
+                        self.find_button.configure(state="normal")
+                    self.model_menu.configure(state="normal")
+                    self.model_menu.set(self.model_name)
+                    self._set_busy(None)
+                    messagebox.showerror("Error", payload)
+                    continue
+                if query_id != self._query_id:
+                    continue
+                if kind == "results":
+                    self.display_results(payload)
+                    self._set_busy("Rendering animation...")
+                    self._render_cancel = threading.Event()
+                    self._render_executor.submit(
+                        self._render_worker, query_id, animation_data, payload, self._render_cancel
+                    )
+                elif kind == "error":
+                    self._set_busy(None)
+                    messagebox.showerror("Error", str(payload))
+                else:
+                    self._render_cancel = None
+                    self._set_busy(None)
+        except queue.Empty:
+            pass
+        self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll_results)
+
+    def _set_busy(self, message):
+        """Show a busy message in the status line, or clear it with None"""
+        self.status_label.configure(text=message or "")
+        self.master.configure(cursor="watch" if message else "")
+
+    def close(self):
+        """Cancel outstanding work and close the window"""
+        self._query_id += 1
+        if self._render_cancel is not None:
+            self._render_cancel.set()
+        self.master.after_cancel(self._poll_id)
+        self._query_executor.shutdown(wait=False, cancel_futures=True)
+        self._render_executor.shutdown(wait=False, cancel_futures=True)
+        if self.query_cache is not None:
+            print(f"Query cache: {self.query_cache.stats()}")
+            if self.query_client is not None:
+                self.query_cache.close()
+        # Closing the models saves their query caches
+        self.registry.close()
+        self.master.destroy()
+
+    def calculate_similar_words(self, input_text, full=False):
+        """
+        Top similar words for a query, answered from the query cache when possible;
+        `full` makes tiered search scan the whole vocabulary
+        """
+        if self.query_cache is None:
+            return self._search_similar_words(input_text, full)
 
-    def calculate_similar_words(self, input_text):
         text = self.parse_input(input_text)
-        
-        positives = []
-        negatives = []
-        for order, token in enumerate(text):
-            if order > 0 and text[order - 1] == "-":
-                negatives.append(token.lower())
-            elif token not in ["+", "-", " "]:
-                positives.append(token.lower())
+        positives, negatives = split_terms(text)
+        entry = self.query_cache.get(query_key(positives, negatives, 5, self._answering_mode(full)))
+        if entry is not None:
+            similar_words, self.animation_data = restore_entry(
+                entry, positives + negatives, self._determine_operations(text)
+            )
+            return similar_words
+
+        similar_words = self._search_similar_words(input_text, full)
+        # Keyed by whoever answered, in case the server went away mid-query
+        key = query_key(positives, negatives, 5, self._answering_mode(full))
+        self.query_cache.put(key, make_entry(similar_words, self.animation_data))
+        return similar_words
+
+    def _answering_mode(self, full=False):
+        """
+        The search mode queries are answered with: "server", the in-process engine's, or
+        "tiered+full" for a tiered search asked to scan everything
+        """
+        if self.query_client is not None:
+            return "server"
+        return f"{self.search_mode}+full" if full and self.search_mode == "tiered" else self.search_mode
+
+    def _search_similar_words(self, input_text, full=False):
+        if self.query_client is not None:
+            try:
+                with span("query.server"):
+                    similar_words, self.animation_data = self.query_client.query(input_text)
+                return similar_words
+            except ConnectionError as e:
+                # The server went away; continue in process from now on
+                print(f"{e}; falling back to in-process search")
+                self.query_cache.close()
+                self.query_client = None
+                self._activate_model(self.model_name, self._requested_search_mode)
+
+        text = self.parse_input(input_text)
+        positives, negatives = split_terms(text)
 
         print(negatives)
         print(positives)
-        
-        similar_words = self.embeddings.most_similar(positive=positives, negative=negatives, topn=5)
-        similar_words = [(word, round(score * 100, 2)) for word, score in similar_words if word not in positives + negatives]
+
+        # One fused pass gathers the inputs, searches and collects the animation arrays
+        with span("query.run", engine=self.search_mode, words=len(positives + negatives)):
+            result = run_query(self.search_engine, positives, negatives, topn=5, neighbours=self.neighbours,
+                               full=full)
+        similar_words = [(word, round(float(score) * 100, 2)) for word, score in zip(result['similar_words'], result['scores'])]
         print(similar_words)
-        
-        # Store data for animations
-        self.animation_data = {
-            'inputs': [(word, self.embeddings[word]) for word in positives + negatives],
+
+        # Store data for animations, as 2D coordinates so the render payload stays small
+        self.animation_data = project_animation_data(self.projection, {
+            'inputs': list(zip(result['words'], result['input_vectors'])),
             'ops': self._determine_operations(text),
-            'result_vector': self._calculate_result_vector(positives, negatives),
-            'similar_words': similar_words
-        }
-        
+            'result_vector': result['result_vector'],
+            'similar_words': similar_words,
+            'similar_vectors': result['similar_vectors']
+        })
+
         return similar_words
          
     def parse_input(self, input_text: str):
         # Parse the input text to extract words and operations
-        # This is a placeholder for actual parsing logic
-        return input_text.split()
+        return parse_input(input_text)
     
     def _determine_operations(self, text):
         """Determine the sequence of operations from parsed text"""
-        ops = []
-        for i, token in enumerate(text):
-            if token == "+":
-                ops.append("add")
-            elif token == "-":
-                ops.append("sub")
-        return ops
-    
-    def _calculate_result_vector(self, positives, negatives):
-        """Calculate the resulting vector from positive and negative words"""
-        result_vector = np.zeros(self.embeddings.vector_size)
-        
-        for word in positives:
-            if word in self.embeddings:
-                result_vector += self.embeddings[word]
-        
-        for word in negatives:
-            if word in self.embeddings:
-                result_vector -= self.embeddings[word]
-                
-        return result_vector
+        return determine_operations(text)
     
     def display_results(self, similar_words):
         self.wheel_picker.update_items(similar_words)
-        
-        # Launch animations after displaying results
-        if hasattr(self, 'animation_data'):
-            try:
-                # Prepare data for animations
-                inputs = self.animation_data['inputs']
-                ops = self.animation_data['ops'] if self.animation_data['ops'] else ["add"]  # Default to add if no ops
-                result_word = "Result"
-                result_vector = self.animation_data['result_vector']
-                similars = [(word, self.embeddings[word], score/100.0) 
-                          for word, score in similar_words[:5]]
-                
-                # Launch animations
-                run_animations(inputs, ops, (result_word, result_vector), similars)
-            except Exception as e:
-                print(f"Error launching animations: {e}")
+
+    def launch_animations(self, animation_data, similar_words, cancel_event=None):
+        """Render the animations for a query; blocks, so call it off the Tk thread"""
+        from run_animations import run_animations
+
+        # Prepare data for animations
+        inputs = animation_data['inputs']
+        ops = animation_data['ops'] if animation_data['ops'] else ["add"]  # Default to add if no ops
+        result_word = "Result"
+        result_vector = animation_data['result_vector']
+        similars = [(word, vector, score/100.0)
+                  for (word, score), vector in zip(similar_words[:5], animation_data['similar_vectors'])]
+
+        # Launch animations
+        run_animations(inputs, ops, (result_word, result_vector), similars, cancel_event=cancel_event)
 
 if __name__ == "__main__":
     root = CTk()
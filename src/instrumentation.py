@@ -0,0 +1,155 @@
+"""
+Lightweight, toggleable timing and memory instrumentation.
+
+Code marks hot paths with ``with span("name", key=value) as s: ...`` and bumps
+counters with ``count("name")``. While instrumentation is off both calls return
+immediately (``span`` hands back a shared no-op object), so they can stay in the
+hot paths permanently. Turn it on with ``EMBEDDINGS_TRACE=1`` (optionally
+``EMBEDDINGS_TRACE_LOG=path``) or by calling `enable`. Finished spans are written
+as JSON lines to a rotating log and aggregated in memory for `stats`.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Optional
+
+_enabled = False
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+_logger = logging.getLogger("embeddings.trace")
+_logger.propagate = False
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes() -> int:
+    """Current resident set size; falls back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "fields", "_start", "_rss")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self._rss = rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        fields = {"rss_delta": rss_bytes() - self._rss, **self.fields}
+        if exc_type is not None:
+            fields["error"] = exc_type.__name__
+        _finish(self.name, duration_ms, fields)
+        return False
+
+    def set(self, **fields):
+        """Attach extra fields (bytes, cache hits, ...) once they are known"""
+        self.fields.update(fields)
+
+
+def _finish(name, duration_ms, fields):
+    with _lock:
+        total = _spans.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        total["count"] += 1
+        total["total_ms"] += duration_ms
+        total["max_ms"] = max(total["max_ms"], duration_ms)
+    if _logger.handlers:
+        record = {"span": name, "ms": round(duration_ms, 3), "thread": threading.current_thread().name, **fields}
+        _logger.info(json.dumps(record, default=str))
+
+
+def span(name: str, **fields):
+    """Time a block; a no-op unless instrumentation is enabled"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, fields)
+
+
+def record(name: str, duration_ms: float, **fields):
+    """Record a span timed elsewhere (e.g. in a child process); a no-op unless enabled"""
+    if _enabled:
+        _finish(name, duration_ms, fields)
+
+
+def count(name: str, value: int = 1):
+    """Add `value` to a named counter; a no-op unless instrumentation is enabled"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(log_path: Optional[str] = None, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3):
+    """Start recording; with `log_path` every span is also appended to a rotating JSON-lines log"""
+    global _enabled
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    if log_path:
+        handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def stats() -> dict:
+    """Snapshot of aggregated span timings, counters and current RSS"""
+    with _lock:
+        spans = {name: dict(total) for name, total in _spans.items()}
+        counters = dict(_counters)
+    for total in spans.values():
+        total["mean_ms"] = total["total_ms"] / total["count"]
+    return {"enabled": _enabled, "rss_bytes": rss_bytes(), "spans": spans, "counters": counters}
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+if os.environ.get("EMBEDDINGS_TRACE", "").lower() in ("1", "true", "yes", "on"):
+    enable(os.environ.get("EMBEDDINGS_TRACE_LOG", "embeddings_trace.log"))
@@ -0,0 +1,159 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import ProgressCallback, load_static_embeddings, vocabulary_variant
+from instrumentation import count, span
+
+# Rough per-word cost of the vocabulary list and word -> row dict
+_BYTES_PER_WORD = 120
+
+
+def read_word_list(path) -> List[str]:
+    """Words from a file with one word per line"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class ModelSpec:
+    """Where a model lives and how to read it; the keyword arguments of `load_static_embeddings`"""
+
+    def __init__(self, name: str, path: str, binary: bool = True, no_header: bool = False,
+                 limit: Optional[int] = None, allow_list: Optional[List[str]] = None):
+        self.name = name
+        self.path = path
+        self.binary = binary
+        self.no_header = no_header
+        self.limit = limit
+        self.allow_list = allow_list
+
+    @property
+    def restricted(self) -> bool:
+        """True if only part of the file's vocabulary is loaded"""
+        return self.limit is not None or self.allow_list is not None
+
+    @property
+    def variant(self) -> Optional[str]:
+        """Tag of the cache files derived from this model's vocabulary, None for the full file"""
+        return vocabulary_variant(self.limit, self.allow_list)
+
+    @classmethod
+    def from_dict(cls, entry: dict) -> "ModelSpec":
+        allow_list = read_word_list(entry["allow_list"]) if entry.get("allow_list") else None
+        return cls(entry["name"], entry["path"], entry.get("binary", True), entry.get("no_header", False),
+                   entry.get("limit"), allow_list)
+
+
+def read_model_specs(path) -> List[ModelSpec]:
+    """
+    Model list from a JSON file: ``[{"name": ..., "path": ..., "binary": ..., "no_header": ...,
+    "limit": ..., "allow_list": <word list file>}, ...]``
+    """
+    with open(path) as f:
+        return [ModelSpec.from_dict(entry) for entry in json.load(f)]
+
+
+class LoadedModel:
+    """
+    A resident model. `extras` holds whatever the caller derives from the embeddings
+    (search engine, indexes, caches) so it is dropped together with the model.
+    """
+
+    def __init__(self, spec: ModelSpec, embeddings: "KeyedVectors"):
+        self.spec = spec
+        self.embeddings = embeddings
+        self.extras = {}
+
+    def resident_bytes(self) -> int:
+        """
+        Memory the model can occupy. Memory-mapped vectors are counted too: the pages a
+        model's queries touch stay resident until it is dropped.
+        """
+        total = self.embeddings.vectors.nbytes + len(self.embeddings.index_to_key) * _BYTES_PER_WORD
+        if self.embeddings.norms is not None:
+            total += self.embeddings.norms.nbytes
+        return total
+
+    def close(self):
+        for extra in self.extras.values():
+            close = getattr(extra, "close", None)
+            if callable(close):
+                close()
+        self.extras.clear()
+
+
+class ModelRegistry:
+    """
+    Named embedding models, loaded on first use and kept within a RAM budget.
+
+    Resident models are kept in least-recently-used order; when loading a model takes
+    the total past `budget_bytes`, the least recently used others are closed and
+    dropped. With the memory-mapped cache, reloading an evicted model is fast.
+    """
+
+    def __init__(self, specs: List[ModelSpec], budget_bytes: int):
+        self.specs: Dict[str, ModelSpec] = {spec.name: spec for spec in specs}
+        self.budget_bytes = budget_bytes
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    def loaded(self) -> List[str]:
+        """Names of resident models, least recently used first"""
+        with self._lock:
+            return list(self._models)
+
+    def get(self, name: str, progress: Optional[ProgressCallback] = None, evict: bool = True) -> LoadedModel:
+        """
+        The model called `name`, loading it if it is not resident. With `evict` false
+        other models stay resident even past the budget until `evict` is called, so a
+        caller can finish setting the new model up before the old one is dropped.
+        """
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+                count("model_registry.hit")
+                return model
+
+            spec = self.specs[name]
+            count("model_registry.miss")
+            with span("model_registry.load", model=name):
+                embeddings = load_static_embeddings(spec.path, binary=spec.binary, no_header=spec.no_header,
+                                                    progress=progress, limit=spec.limit, allow_list=spec.allow_list)
+            if embeddings is None:
+                raise RuntimeError(f"Could not load model {name} from {spec.path}")
+            model = LoadedModel(spec, embeddings)
+            self._models[name] = model
+            if evict:
+                self._evict(keep=name)
+            return model
+
+    def evict(self, keep: str):
+        """Drop least recently used models other than `keep` until the rest fit the budget"""
+        with self._lock:
+            self._evict(keep)
+
+    def _evict(self, keep: str):
+        total = sum(model.resident_bytes() for model in self._models.values())
+        for name in list(self._models):
+            if total <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            model = self._models.pop(name)
+            total -= model.resident_bytes()
+            model.close()
+            count("model_registry.evicted")
+
+    def close(self):
+        with self._lock:
+            for model in self._models.values():
+                model.close()
+            self._models.clear()
@@ -0,0 +1,177 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from embeddings_loader import cache_path, load_static_embeddings, source_fingerprint
+
+# Rows answered per job, and vocabulary columns scored at a time within a job
+ROW_BLOCK = 256
+COLUMN_BLOCK = 16384
+# Peak memory of a job: the float32 score block plus the int64 positions argpartition
+# returns for it (48 MB), and the interpreter with numpy imported
+JOB_BYTES = ROW_BLOCK * COLUMN_BLOCK * (4 + 8) + 100 * 1024 * 1024
+
+
+def _top_columns(scores: np.ndarray, topn: int) -> np.ndarray:
+    """Column positions of the `topn` highest scores in each row, unordered"""
+    width = scores.shape[1]
+    if width <= topn:
+        return np.broadcast_to(np.arange(width), scores.shape)
+    return np.argpartition(scores, width - topn, axis=1)[:, width - topn:]
+
+
+def _build_block(file_path, start: int, end: int, topn: int) -> int:
+    """
+    Fill rows [start, end) of the table: score those words against the whole
+    vocabulary column block by column block, keeping a running top-`topn`.
+    """
+    vectors = np.load(cache_path(file_path, "vectors.npy"), mmap_mode="r")
+    norms = np.load(cache_path(file_path, "norms.npy"), mmap_mode="r")
+    # Only the query rows are normalized; raw block scores are divided by the column norms
+    query_norms = norms[start:end]
+    queries = vectors[start:end] / np.where(query_norms > 0, query_norms, 1)[:, None]
+
+    best_indices = np.empty((end - start, 0), dtype=np.int64)
+    best_scores = np.empty((end - start, 0), dtype=np.float32)
+    for col in range(0, len(vectors), COLUMN_BLOCK):
+        stop = min(col + COLUMN_BLOCK, len(vectors))
+        scores = queries @ vectors[col:stop].T
+        block_norms = norms[col:stop]
+        scores /= np.where(block_norms > 0, block_norms, 1)
+        # A word is not its own neighbour
+        own = np.arange(max(start, col), min(end, stop))
+        scores[own - start, own - col] = -np.inf
+
+        # Only the block's own top candidates are merged with the running best
+        keep = _top_columns(scores, topn)
+        scores = np.concatenate((best_scores, np.take_along_axis(scores, keep, axis=1)), axis=1)
+        indices = np.concatenate((best_indices, keep + col), axis=1)
+        keep = _top_columns(scores, topn)
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_indices = np.take_along_axis(indices, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    table_indices = np.load(cache_path(file_path, "knn_indices.partial.npy"), mmap_mode="r+")
+    table_scores = np.load(cache_path(file_path, "knn_scores.partial.npy"), mmap_mode="r+")
+    table_indices[start:end] = np.take_along_axis(best_indices, order, axis=1)
+    table_scores[start:end] = np.take_along_axis(best_scores, order, axis=1)
+    table_indices.flush()
+    table_scores.flush()
+    return start
+
+
+def _build_block_args(args):
+    return _build_block(*args)
+
+
+def build_neighbour_table(file_path, n_words: int = 100000, topn: int = 50, workers: Optional[int] = None,
+                          memory_mb: int = 2048):
+    """
+    Compute the `topn` nearest neighbours of the first (most frequent) `n_words` words.
+
+    Results go to ``knn_indices.npy`` (int32) and ``knn_scores.npy`` (float16) in the
+    embeddings cache. A process pool fills them block by block under ``.partial.npy``
+    names, which are renamed into place once the table is complete, so a rebuild never
+    touches a table other processes have memory-mapped. Finished blocks are recorded in
+    ``knn_progress.json``, so an interrupted build resumes where it stopped.
+    The embeddings cache must already exist (`load_static_embeddings` builds it).
+
+    Unless `workers` is given, the pool runs as many jobs as fit in `memory_mb`, at
+    most one per CPU.
+    """
+    vocab_size = len(np.load(cache_path(file_path, "norms.npy"), mmap_mode="r"))
+    n_words = min(n_words, vocab_size)
+    topn = min(topn, vocab_size - 1)
+    progress_path = cache_path(file_path, "knn_progress.json")
+    params = {"source": source_fingerprint(file_path), "n_words": n_words, "topn": topn}
+
+    try:
+        with open(progress_path) as f:
+            progress = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        progress = {}
+    if progress.get("params") == params and progress.get("complete"):
+        return
+    if progress.get("params") != params:
+        np.lib.format.open_memmap(cache_path(file_path, "knn_indices.partial.npy"), mode="w+", dtype=np.int32,
+                                  shape=(n_words, topn))
+        np.lib.format.open_memmap(cache_path(file_path, "knn_scores.partial.npy"), mode="w+", dtype=np.float16,
+                                  shape=(n_words, topn))
+        progress = {"params": params, "done": [], "complete": False}
+
+    def save_progress():
+        tmp_path = f"{progress_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, progress_path)
+
+    done = set(progress["done"])
+    jobs = [(file_path, start, min(start + ROW_BLOCK, n_words), topn)
+            for start in range(0, n_words, ROW_BLOCK) if start not in done]
+    if jobs:
+        print(f"{len(done)} blocks done, {len(jobs)} to go")
+    if workers is None:
+        workers = max(1, min(os.cpu_count() or 1, memory_mb * 1024 * 1024 // JOB_BYTES))
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        for start in pool.imap_unordered(_build_block_args, jobs):
+            progress["done"].append(start)
+            save_progress()
+    for name in ("knn_indices", "knn_scores"):
+        os.replace(cache_path(file_path, f"{name}.partial.npy"), cache_path(file_path, f"{name}.npy"))
+    progress["complete"] = True
+    save_progress()
+
+
+class NeighbourTable:
+    """Precomputed nearest neighbours of the most frequent words, memory-mapped"""
+
+    def __init__(self, indices: np.ndarray, scores: np.ndarray):
+        self.indices = indices
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.indices)
+
+    def lookup(self, row: int, topn: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(indices, scores) of the `topn` neighbours of `row`, or None if not in the table"""
+        if row >= len(self.indices) or topn > self.indices.shape[1]:
+            return None
+        return self.indices[row, :topn].astype(np.int64), self.scores[row, :topn].astype(np.float32)
+
+
+def load_neighbour_table(file_path) -> Optional[NeighbourTable]:
+    """The table built for the current embeddings file, or None if there is no complete one"""
+    try:
+        with open(cache_path(file_path, "knn_progress.json")) as f:
+            progress = json.load(f)
+        if not progress.get("complete") or progress["params"]["source"] != source_fingerprint(file_path):
+            return None
+        return NeighbourTable(
+            np.load(cache_path(file_path, "knn_indices.npy"), mmap_mode="r"),
+            np.load(cache_path(file_path, "knn_scores.npy"), mmap_mode="r"),
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute nearest neighbours of the most frequent words.")
+    parser.add_argument("file_path")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--words", type=int, default=100000, help="number of most frequent words to cover")
+    parser.add_argument("--topn", type=int, default=50, help="neighbours stored per word")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--memory-mb", type=int, default=2048, help="memory the worker pool may use")
+    args = parser.parse_args()
+
+    # Builds the vector cache the workers read from, if it is missing
+    embeddings = load_static_embeddings(args.file_path, binary=not args.text, no_header=args.no_header)
+    start = time.perf_counter()
+    build_neighbour_table(args.file_path, args.words, args.topn, args.workers, args.memory_mb)
+    print(f"Built in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,97 @@
+import os
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import cache_dir, cache_path, cache_stamp, temp_path
+
+# Typical projected vector length, in manim screen units
+TARGET_LENGTH = 2.5
+
+
+class Projection:
+    """
+    Linear 2D projection of the embeddings for the animations.
+
+    The axes are the two principal components of (a sample of) the matrix. Vectors are
+    projected without re-centering, so the map is linear and vector arithmetic carries
+    over: ``project(a - b + c) == project(a) - project(b) + project(c)``. `scale` sizes
+    the output so a typical word vector is about `TARGET_LENGTH` screen units long.
+    """
+
+    def __init__(self, components: np.ndarray, scale: float):
+        self.components = components
+        self.scale = float(scale)
+
+    @classmethod
+    def fit(cls, embeddings: "KeyedVectors", sample: int = 100000, seed: int = 0) -> "Projection":
+        vectors = embeddings.vectors
+        if len(vectors) > sample:
+            rows = np.sort(np.random.default_rng(seed).choice(len(vectors), sample, replace=False))
+            vectors = vectors[rows]
+        vectors = np.asarray(vectors, dtype=np.float64)
+        centered = vectors - vectors.mean(axis=0)
+        _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        components = eigenvectors[:, ::-1][:, :2]
+        # Fix the sign of each axis so refits give the same picture
+        components *= np.where(components[np.abs(components).argmax(axis=0), [0, 1]] < 0, -1, 1)
+        lengths = np.linalg.norm(vectors @ components, axis=1)
+        typical = float(np.percentile(lengths, 90)) or 1.0
+        return cls(components.astype(np.float32), TARGET_LENGTH / typical)
+
+    def project(self, vectors) -> np.ndarray:
+        """2D coordinates of one vector or a stack of vectors"""
+        return (np.asarray(vectors, dtype=np.float32) @ self.components) * self.scale
+
+    def save(self, path, stamp: str = ""):
+        tmp_path = temp_path(path)
+        np.savez(tmp_path, components=self.components, scale=np.float64(self.scale), stamp=np.array(stamp))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, stamp: Optional[str] = None) -> "Projection":
+        """Load a saved projection; raises `ValueError` if it was fitted to other vectors than `stamp`"""
+        with np.load(path) as data:
+            if stamp is not None and ("stamp" not in data.files or str(data["stamp"]) != stamp):
+                raise ValueError(f"Projection {path} was fitted to a different embeddings file")
+            return cls(data["components"], float(data["scale"]))
+
+
+def project_animation_data(projection: Optional[Projection], animation_data: dict) -> dict:
+    """Replace the vectors in GUI animation data with their 2D projections"""
+    if projection is None:
+        return animation_data
+    return {
+        **animation_data,
+        "inputs": [(word, projection.project(vector)) for word, vector in animation_data["inputs"]],
+        "result_vector": projection.project(animation_data["result_vector"]),
+        "similar_vectors": list(projection.project(animation_data["similar_vectors"])),
+    }
+
+
+def load_projection(embeddings: "KeyedVectors", file_path, rebuild=False,
+                    variant: Optional[str] = None) -> Projection:
+    """
+    Return the projection cached with the embeddings, fitting it on first use;
+    `variant` tags the file of a restricted vocabulary (see `vocabulary_variant`)
+    """
+    path = cache_path(file_path, "proj2d.npz", variant)
+    stamp = cache_stamp(file_path)
+    if not rebuild:
+        try:
+            projection = Projection.load(path, stamp)
+            if projection.components.shape[0] == embeddings.vector_size:
+                return projection
+        except Exception:
+            # Missing, stale or damaged
+            pass
+    projection = Projection.fit(embeddings)
+    try:
+        os.makedirs(cache_dir(file_path), exist_ok=True)
+        projection.save(path, stamp)
+    except OSError as e:
+        print(f"Error saving projection: {e}")
+    return projection
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import time
+from typing import List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import cache_dir, cache_path, cache_stamp, load_static_embeddings, temp_path
+from search import ExactSearch, SearchEngine, top_k
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+# Rows are converted and scored in blocks so no full-size float32 copy is ever made
+_SCORE_BLOCK = 65536
+
+
+class QuantizedIndex(SearchEngine):
+    """
+    Compact copy of the normalized embeddings used for candidate scoring.
+
+    ``float16`` stores each unit row at half precision; ``int8`` stores each unit row
+    scaled by its own max-abs value, ``row ~= codes * scale``. A query scores every row
+    on the compact matrix, then re-scores a shortlist of ``rerank * (topn + inputs)``
+    candidates against the float32 vectors, which are read from the memory-mapped
+    cache and so never need to be resident as a whole.
+    """
+
+    def __init__(self, embeddings: "KeyedVectors", codes: np.ndarray, scales: np.ndarray = None, rerank: int = 10):
+        super().__init__(embeddings)
+        self.codes = codes
+        self.scales = scales
+        self.rerank = rerank
+
+    @property
+    def dtype(self) -> str:
+        return str(self.codes.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def build(cls, embeddings: "KeyedVectors", dtype: str = "int8") -> "QuantizedIndex":
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unsupported quantization: {dtype}")
+        embeddings.fill_norms()
+        count, dim = embeddings.vectors.shape
+        codes = np.empty((count, dim), dtype=np.dtype(dtype))
+        scales = np.empty(count, dtype=np.float32) if dtype == "int8" else None
+        for start in range(0, count, _SCORE_BLOCK):
+            end = min(count, start + _SCORE_BLOCK)
+            norms = embeddings.norms[start:end]
+            unit = embeddings.vectors[start:end] / np.where(norms > 0, norms, 1)[:, None]
+            if dtype == "int8":
+                block_scales = np.abs(unit).max(axis=1) / 127
+                block_scales[block_scales == 0] = 1
+                codes[start:end] = np.rint(unit / block_scales[:, None])
+                scales[start:end] = block_scales
+            else:
+                codes[start:end] = unit
+        return cls(embeddings, codes, scales)
+
+    def save(self, file_path, variant: Optional[str] = None):
+        """
+        Write the codes, then a ``<dtype>.json`` stamp naming the vectors they encode;
+        `variant` tags the files of a restricted vocabulary (see `vocabulary_variant`).
+
+        Files are renamed into place rather than rewritten, so processes that have the
+        old codes memory-mapped keep reading them. The stamp is removed first and
+        written last, so a reader never pairs it with half-replaced files.
+        """
+        os.makedirs(cache_dir(file_path), exist_ok=True)
+        stamp_path = cache_path(file_path, f"{self.dtype}.json", variant)
+        try:
+            os.remove(stamp_path)
+        except FileNotFoundError:
+            pass
+        arrays = [(f"{self.dtype}.npy", self.codes)]
+        if self.scales is not None:
+            arrays.append((f"{self.dtype}_scales.npy", self.scales))
+        for name, array in arrays:
+            path = cache_path(file_path, name, variant)
+            tmp_path = temp_path(path)
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        tmp_path = temp_path(stamp_path)
+        with open(tmp_path, "w") as f:
+            json.dump({"stamp": cache_stamp(file_path)}, f)
+        os.replace(tmp_path, stamp_path)
+
+    @classmethod
+    def load(cls, embeddings: "KeyedVectors", file_path, dtype: str = "int8",
+             variant: Optional[str] = None) -> "QuantizedIndex":
+        try:
+            with open(cache_path(file_path, f"{dtype}.json", variant)) as f:
+                stamp = json.load(f).get("stamp")
+        except json.JSONDecodeError:
+            stamp = None
+        if stamp != cache_stamp(file_path):
+            raise ValueError(f"Quantized {dtype} cache was built from a different embeddings file")
+        codes = np.load(cache_path(file_path, f"{dtype}.npy", variant), mmap_mode="r")
+        if len(codes) != len(embeddings.vectors):
+            raise ValueError(f"Quantized {dtype} cache does not match the loaded embeddings")
+        scales = np.load(cache_path(file_path, f"{dtype}_scales.npy", variant)) if dtype == "int8" else None
+        return cls(embeddings, codes, scales)
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row to a unit query, computed on the compact matrix"""
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), _SCORE_BLOCK):
+            end = min(len(self.codes), start + _SCORE_BLOCK)
+            np.dot(self.codes[start:end].astype(np.float32), query, out=scores[start:end])
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query, topn, exclude=(), full=False):
+        exclude = list(exclude)
+        shortlist, _ = top_k(self.approximate_scores(query), self.rerank * (topn + len(exclude)))
+        shortlist = np.sort(shortlist)
+        self.embeddings.fill_norms()
+        exact = (self.embeddings.vectors[shortlist] @ query) / self.embeddings.norms[shortlist]
+        best, scores = top_k(exact, topn, np.flatnonzero(np.isin(shortlist, exclude)))
+        return shortlist[best], scores
+
+
+def load_quantized_index(embeddings: "KeyedVectors", file_path, dtype: str = "int8",
+                         variant: Optional[str] = None) -> QuantizedIndex:
+    """Return the quantized matrix cached next to `file_path`, building it on first use"""
+    try:
+        return QuantizedIndex.load(embeddings, file_path, dtype, variant)
+    except Exception:
+        # Missing, stale or damaged
+        index = QuantizedIndex.build(embeddings, dtype)
+        index.save(file_path, variant)
+        return index
+
+
+def compare_with_exact(index: QuantizedIndex, queries: List[List[str]], topn: int = 5) -> dict:
+    """
+    Report memory, mean latency and top-k disagreement of a quantized index against
+    exact float32 search, side by side, for positive-only queries.
+    """
+    exact = ExactSearch(index.embeddings)
+    report = {
+        "dtype": index.dtype,
+        "queries": len(queries),
+        "float32_bytes": int(index.embeddings.vectors.nbytes),
+        "quantized_bytes": int(index.nbytes),
+        "float32_ms": 0.0,
+        "quantized_ms": 0.0,
+        "disagreements": 0,
+    }
+    for words in queries:
+        start = time.perf_counter()
+        expected = exact.most_similar(positive=words, topn=topn)
+        report["float32_ms"] += time.perf_counter() - start
+        start = time.perf_counter()
+        found = index.most_similar(positive=words, topn=topn)
+        report["quantized_ms"] += time.perf_counter() - start
+        if [w for w, _ in expected] != [w for w, _ in found]:
+            report["disagreements"] += 1
+    for key in ("float32_ms", "quantized_ms"):
+        report[key] = round(1000 * report[key] / max(1, len(queries)), 3)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a quantized embedding matrix and compare it with exact search.")
+    parser.add_argument("file_path")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--dtype", choices=QUANTIZED_DTYPES, default="int8")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = load_static_embeddings(args.file_path, binary=not args.text, no_header=args.no_header)
+    index = load_quantized_index(embeddings, args.file_path, args.dtype)
+    rng = np.random.default_rng(0)
+    pool = min(len(embeddings.index_to_key), 50000)
+    queries = [[embeddings.index_to_key[i]] for i in rng.choice(pool, min(pool, args.queries), replace=False)]
+    for key, value in compare_with_exact(index, queries).items():
+        print(f"{key:>16}: {value}")
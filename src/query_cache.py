@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from embeddings_loader import cache_path, source_fingerprint
+from instrumentation import count
+
+QUERY_CACHE_VERSION = 2
+
+
+def query_key(positives: List[str], negatives: List[str], topn: int, mode: str) -> str:
+    """
+    Canonical form of a query: case and word order within each side do not matter.
+    `mode` names the engine that answers it, since approximate and quantized search can
+    return different words than an exact scan.
+    """
+    plus = sorted(word.lower() for word in positives)
+    minus = sorted(word.lower() for word in negatives)
+    return json.dumps([mode, plus, minus, topn], separators=(",", ":"))
+
+
+def make_entry(similar_words, animation_data: dict) -> dict:
+    """JSON-ready cache entry for the results of one query"""
+    return {
+        "similar_words": [[word, score] for word, score in similar_words],
+        "vectors": {word.lower(): np.asarray(vector).tolist() for word, vector in animation_data["inputs"]},
+        "result_vector": np.asarray(animation_data["result_vector"]).tolist(),
+        "similar_vectors": [np.asarray(vector).tolist() for vector in animation_data["similar_vectors"]],
+    }
+
+
+def restore_entry(entry: dict, words: List[str], ops: List[str]) -> Tuple[list, dict]:
+    """
+    (similar_words, animation_data) from a cache entry, with the inputs laid out in the
+    order of `words` since the cached query may have listed them differently
+    """
+    similar_words = [tuple(pair) for pair in entry["similar_words"]]
+    animation_data = {
+        "inputs": [(word, np.asarray(entry["vectors"][word.lower()], dtype=np.float32)) for word in words],
+        "ops": ops,
+        "result_vector": np.asarray(entry["result_vector"]),
+        "similar_words": similar_words,
+        "similar_vectors": [np.asarray(vector, dtype=np.float32) for vector in entry["similar_vectors"]],
+    }
+    return similar_words, animation_data
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results, optionally persisted as JSON.
+
+    The file records the fingerprint of the embeddings file the results came from;
+    a cache saved against a different file is discarded on load.
+    """
+
+    def __init__(self, max_entries: int = 1000, path: Optional[str] = None, fingerprint: Optional[dict] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                count("query_cache.miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            count("query_cache.hit")
+            return entry
+
+    def put(self, key: str, entry: dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def save(self):
+        """Write the entries, least recently used first; a no-op for an in-memory cache"""
+        if self.path is None:
+            return
+        with self._lock:
+            payload = {
+                "version": QUERY_CACHE_VERSION,
+                "source": self.fingerprint,
+                "entries": list(self._entries.items()),
+            }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        """Save on shutdown, reporting rather than raising write errors"""
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Error saving query cache: {e}")
+
+    def load(self):
+        """Read saved entries if they belong to the same embeddings file"""
+        try:
+            with open(self.path) as f:
+                payload = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if payload.get("version") != QUERY_CACHE_VERSION or payload.get("source") != self.fingerprint:
+            return
+        with self._lock:
+            for key, entry in payload["entries"][-self.max_entries:]:
+                self._entries[key] = entry
+
+
+def load_query_cache(file_path, max_entries: int = 1000, variant: Optional[str] = None,
+                     fingerprint: Optional[dict] = None) -> QueryCache:
+    """
+    The query cache persisted with the embeddings, in its own file for a restricted
+    vocabulary `variant`. Entries are valid for `fingerprint`, by default that of the
+    embeddings file; the cache is kept in memory only if that file is not available
+    to fingerprint.
+    """
+    if fingerprint is None:
+        try:
+            fingerprint = source_fingerprint(file_path)
+        except OSError:
+            return QueryCache(max_entries)
+    cache = QueryCache(max_entries, cache_path(file_path, "query_cache.json", variant), fingerprint)
+    cache.load()
+    return cache
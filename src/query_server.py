@@ -0,0 +1,278 @@
+import argparse
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import cache_stamp, load_static_embeddings
+from expressions import determine_operations, parse_input, split_terms
+from instrumentation import count, span, stats
+from projection import Projection, load_projection
+from search import gather_inputs, query_matrix
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Largest number of similar words one request may ask for
+MAX_TOPN = 100
+
+
+class QueryBatcher:
+    """
+    Collects concurrent similarity queries and scores them together.
+
+    Requests wait at most `max_wait_ms` for company; each batch of up to `max_batch`
+    queries is scored against the whole matrix with one matrix multiply, so the
+    vectors are streamed through memory once per batch rather than once per query.
+    """
+
+    def __init__(self, embeddings: "KeyedVectors", max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, positives: List[str], negatives: List[str], topn: int = 5) -> Future:
+        """Queue a query; the future resolves to a list of (row index, score) pairs"""
+        future = Future()
+        try:
+            # Resolve words here so an unknown word fails only its own request
+            for word in positives + negatives:
+                self.embeddings.get_index(word)
+        except KeyError as e:
+            future.set_exception(e)
+            return future
+        self._pending.put((positives, negatives, topn, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._pending.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            try:
+                self._score(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _score(self, batch):
+        count("server.batches")
+        count("server.queries", len(batch))
+        with span("server.score_batch", size=len(batch)):
+            queries, rows, cols = query_matrix(self.embeddings, [(p, n) for p, n, _, _ in batch])
+            scores = queries @ self.embeddings.vectors.T
+            scores /= self.embeddings.norms
+            scores[rows, cols] = -np.inf
+        for row, (_, _, topn, future) in enumerate(batch):
+            k = min(topn, scores.shape[1] - 1)
+            best = np.argpartition(-scores[row], k)[:k]
+            best = best[np.argsort(-scores[row, best])]
+            future.set_result([(int(i), float(scores[row, i])) for i in best])
+
+
+def build_response(embeddings: "KeyedVectors", input_text: str, positives, negatives, matches,
+                   projection: Optional[Projection] = None) -> dict:
+    """
+    The similar words and the animation data the GUI would compute in process; with a
+    `projection` the vectors are sent as 2D coordinates.
+    """
+    similar_words = [(embeddings.index_to_key[i], round(score * 100, 2)) for i, score in matches]
+    _, weights, rows, _ = gather_inputs(embeddings, positives, negatives)
+    rows = rows.astype(np.float64)
+    similar_vectors = embeddings.vectors[[i for i, _ in matches]]
+    if projection is not None:
+        rows = projection.project(rows).astype(np.float64)
+        similar_vectors = projection.project(similar_vectors)
+    return {
+        "similar_words": similar_words,
+        "animation_data": {
+            "inputs": [[word, row.tolist()] for word, row in zip(positives + negatives, rows)],
+            "ops": determine_operations(parse_input(input_text)),
+            "result_vector": (weights.astype(np.float64) @ rows).tolist(),
+            "similar_words": similar_words,
+            "similar_vectors": similar_vectors.tolist(),
+        },
+    }
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    server_version = "EmbeddingsQueryServer/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "vocabulary": len(self.server.embeddings.index_to_key),
+                "stamp": self.server.stamp,
+            })
+        elif self.path == "/stats":
+            self._send_json(200, stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            input_text = request["text"]
+            topn = request.get("topn", 5)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._send_json(400, {"error": "expected a JSON body with a 'text' field"})
+            return
+        if not isinstance(input_text, str):
+            self._send_json(400, {"error": "'text' must be a string"})
+            return
+        if not isinstance(topn, int) or isinstance(topn, bool) or not 1 <= topn <= MAX_TOPN:
+            self._send_json(400, {"error": f"'topn' must be an integer from 1 to {MAX_TOPN}"})
+            return
+
+        try:
+            positives, negatives = split_terms(parse_input(input_text))
+            if not positives + negatives:
+                self._send_json(400, {"error": "no words in query"})
+                return
+            matches = self.server.batcher.submit(positives, negatives, topn).result()
+            response = build_response(
+                self.server.embeddings, input_text, positives, negatives, matches, self.server.projection
+            )
+        except KeyError as e:
+            self._send_json(404, {"error": e.args[0] if e.args else str(e)})
+            return
+        except Exception as e:
+            # Always answer, so a bad query is not mistaken for the server going away
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send_json(200, response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering similarity queries from one shared embedding matrix.
+    `stamp` (see `cache_stamp`) identifies the embeddings file in ``/health``, so
+    clients can tell which vectors their cached answers came from.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, embeddings: "KeyedVectors", host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 max_batch: int = 32, max_wait_ms: float = 5.0, projection: Optional[Projection] = None,
+                 stamp: str = ""):
+        super().__init__((host, port), _QueryHandler)
+        self.embeddings = embeddings
+        self.projection = projection
+        self.stamp = stamp
+        self.batcher = QueryBatcher(embeddings, max_batch, max_wait_ms)
+
+
+class QueryClient:
+    """Thin client used by the GUI to query a running `QueryServer`"""
+
+    def __init__(self, url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def health(self) -> Optional[dict]:
+        """
+        The server's health check: ``{"status", "vocabulary", "stamp"}``, or None if no
+        server answers
+        """
+        try:
+            with urllib.request.urlopen(f"{self.url}/health", timeout=0.5) as response:
+                return json.load(response) if response.status == 200 else None
+        except (OSError, ValueError):
+            return None
+
+    def available(self) -> bool:
+        """True if a server answers the health check"""
+        return self.health() is not None
+
+    def query(self, input_text: str, topn: int = 5) -> Tuple[list, dict]:
+        """
+        Run a query on the server and return (similar_words, animation_data).
+
+        Unknown words raise `KeyError` and other rejected or failed queries `ValueError`;
+        only a server that cannot be reached raises `ConnectionError`.
+        """
+        body = json.dumps({"text": input_text, "topn": topn}).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/query", data=body, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get("error", str(e))
+            except (ValueError, AttributeError):
+                message = str(e)
+            if e.code == 404:
+                raise KeyError(message) from None
+            raise ValueError(message) from None
+        except (urllib.error.URLError, ConnectionError) as e:
+            raise ConnectionError(f"Query server unavailable: {e}") from e
+        except OSError as e:
+            # e.g. a read timeout: the server is up but this query failed
+            raise ValueError(f"Query failed: {e}") from e
+
+        similar_words = [tuple(pair) for pair in payload["similar_words"]]
+        data = payload["animation_data"]
+        animation_data = {
+            "inputs": [(word, np.asarray(vector, dtype=np.float32)) for word, vector in data["inputs"]],
+            "ops": data["ops"],
+            "result_vector": np.asarray(data["result_vector"]),
+            "similar_words": similar_words,
+            "similar_vectors": [np.asarray(vector, dtype=np.float32) for vector in data["similar_vectors"]],
+        }
+        return similar_words, animation_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve similarity queries from one shared copy of the embeddings.")
+    parser.add_argument("--embeddings", default="embeddings/dolma_300_2024_1.2M.100_combined.txt")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    embeddings = load_static_embeddings(args.embeddings, binary=not args.text, no_header=args.no_header)
+    projection = load_projection(embeddings, args.embeddings)
+    server = QueryServer(embeddings, args.host, args.port, args.max_batch, args.max_wait_ms, projection,
+                         cache_stamp(args.embeddings))
+    print(f"Serving {len(embeddings.index_to_key)} words on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+from instrumentation import count
+
+
+def render_key(data: dict, flags: List[str]) -> str:
+    """Content hash of the animation data and the manim flags that affect the output"""
+    payload = json.dumps({"data": data, "flags": flags}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    Content-addressed on-disk cache of rendered animation videos.
+
+    Each entry is a directory named after its `render_key` holding one video per scene.
+    Reading an entry refreshes its mtime; when the cache grows past `max_bytes` the
+    entries with the oldest mtime are deleted first (LRU).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str, scenes: List[str]) -> Optional[Dict[str, str]]:
+        """Return {scene: video path} if every scene is cached, else None"""
+        entry = self._entry(key)
+        paths = {scene: os.path.join(entry, f"{scene}.mp4") for scene in scenes}
+        if not all(os.path.exists(path) for path in paths.values()):
+            count("render_cache.miss")
+            return None
+        os.utime(entry)
+        count("render_cache.hit")
+        return paths
+
+    def put(self, key: str, videos: Dict[str, str]) -> Dict[str, str]:
+        """Copy rendered videos into the cache and return their cached paths"""
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+        for scene, path in videos.items():
+            shutil.copyfile(path, os.path.join(staging, f"{scene}.mp4"))
+
+        entry = self._entry(key)
+        if os.path.exists(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.replace(staging, entry)
+        except OSError:
+            # another render of the same key got there first
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+        return {scene: os.path.join(entry, f"{scene}.mp4") for scene in videos}
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in `max_bytes`"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            entry = self._entry(name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry) if f.is_file())
+            entries.append((os.stat(entry).st_mtime, size, entry))
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            count("render_cache.evicted")
@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Optional
+
+from instrumentation import count, rss_bytes, span
+
+QUALITY_NAMES = {"l": "low_quality", "m": "medium_quality", "h": "high_quality", "k": "fourk_quality"}
+
+
+def _worker_main(conn, shared_dir: str, max_jobs: int, max_rss_bytes: int):
+    """
+    Render loop of a worker process.
+
+    manim and the scene module are imported once; each job is (scene, data, quality,
+    media_dir) and is answered with ("ok", video path, retiring) or ("error", message,
+    retiring). The process exits after `max_jobs` jobs or once its RSS passes
+    `max_rss_bytes`; `retiring` is true on that last reply, so the parent replaces it
+    instead of sending the next job to a process that is going away.
+    """
+    try:
+        import manim
+        import animation
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready",))
+
+    jobs = 0
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        scene_name, data, quality, media_dir = job
+        try:
+            settings = {
+                "quality": QUALITY_NAMES[quality],
+                "media_dir": media_dir,
+                # LaTeX and text glyphs are cached across jobs
+                "tex_dir": os.path.join(shared_dir, "Tex"),
+                "text_dir": os.path.join(shared_dir, "texts"),
+                "preview": False,
+                "progress_bar": "none",
+                "verbosity": "WARNING",
+            }
+            with manim.tempconfig(settings):
+                scene = getattr(animation, scene_name)(data=data)
+                scene.render()
+                reply = ("ok", str(scene.renderer.file_writer.movie_file_path))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        jobs += 1
+        retiring = jobs >= max_jobs or rss_bytes() > max_rss_bytes
+        conn.send(reply + (retiring,))
+        if retiring:
+            return
+
+
+class WorkerError(Exception):
+    """A render worker could not start or died mid-job"""
+
+
+class RenderWorker:
+    """
+    A long-lived process that imports manim once and renders scenes in process.
+
+    Starting manim costs a few seconds per process; keeping one worker around
+    means each query only pays for the render itself. The process is started
+    lazily and replaced after a crash, a cancelled job, or when it retires itself.
+    """
+
+    def __init__(self, shared_dir: str, max_jobs: int = 50, max_rss_mb: int = 1500, start_timeout: float = 60.0):
+        self.shared_dir = shared_dir
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.start_timeout = start_timeout
+        self._process = None
+        self._conn = None
+
+    def _start(self):
+        """Launch a worker and wait for it to import manim; timed as animation.worker_start"""
+        with span("animation.worker_start"):
+            context = multiprocessing.get_context("spawn")
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(child_conn, self.shared_dir, self.max_jobs, self.max_rss_bytes),
+                name="render-worker",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            if not parent_conn.poll(self.start_timeout):
+                process.terminate()
+                raise WorkerError("render worker did not start in time")
+            try:
+                message = parent_conn.recv()
+            except EOFError:
+                message = ("error", "render worker exited during startup")
+            if message[0] != "ready":
+                process.join()
+                raise WorkerError(message[1])
+        self._process, self._conn = process, parent_conn
+        count("render_worker.started")
+
+    def _stop(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process.join()
+            self._conn.close()
+        self._process = self._conn = None
+
+    def render(self, scene: str, data: dict, quality: str, media_dir: str,
+               cancelled=lambda: False, poll_seconds: float = 0.1) -> Optional[str]:
+        """
+        Render `scene` from `data` into `media_dir` and return the video path.
+
+        Returns None if `cancelled()` became true (the worker is killed and replaced on
+        the next job); raises `WorkerError` if the worker failed or the render errored.
+        """
+        if self._process is None or not self._process.is_alive():
+            self._stop()
+            self._start()
+        with span("animation.worker_render", scene=scene) as timing:
+            try:
+                self._conn.send((scene, data, quality, media_dir))
+                while not self._conn.poll(poll_seconds):
+                    if cancelled():
+                        self._stop()
+                        timing.set(cancelled=True)
+                        return None
+                    if not self._process.is_alive():
+                        break
+                status, result, retiring = self._conn.recv()
+            except (EOFError, OSError):
+                self._stop()
+                count("render_worker.crashed")
+                raise WorkerError(f"render worker died while rendering {scene}") from None
+        if retiring:
+            # The worker exits on its own; the next job starts a fresh one
+            self._process.join(timeout=5)
+            self._stop()
+            count("render_worker.retired")
+        if status != "ok":
+            raise WorkerError(result)
+        return result
+
+    def close(self):
+        if self._conn is not None and self._process.is_alive():
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+            self._process.join(timeout=2)
+        self._stop()
+
+
+class RenderWorkerPool:
+    """A fixed set of `RenderWorker`s handed out one job at a time"""
+
+    def __init__(self, size: int, shared_dir: str, **worker_options):
+        self._idle = queue.Queue()
+        self._workers = [RenderWorker(shared_dir, **worker_options) for _ in range(size)]
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def render(self, scene: str, data: dict, quality: str, media_dir: str,
+               cancelled=lambda: False, poll_seconds: float = 0.1) -> Optional[str]:
+        """Wait for an idle worker (or cancellation) and render on it; see `RenderWorker.render`"""
+        while True:
+            try:
+                worker = self._idle.get(timeout=poll_seconds)
+                break
+            except queue.Empty:
+                if cancelled():
+                    return None
+        try:
+            return worker.render(scene, data, quality, media_dir, cancelled, poll_seconds)
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(size: int, shared_dir: str) -> RenderWorkerPool:
+    """The process-wide worker pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderWorkerPool(size, shared_dir)
+        return _pool
@@ -1,49 +1,209 @@
+import glob
 import json
 import subprocess
-from typing import List, Tuple
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 import os
 
+from instrumentation import enabled as instrumentation_enabled, record, span
+from render_cache import RenderCache, render_key
+from render_worker import WorkerError, get_worker_pool
+
+# How often a running render checks whether it has been cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+SCENES = ["VectorOpsScene", "SimilarityScene"]
+QUALITY_FLAGS = {"l": "-ql", "m": "-qm", "h": "-qh", "k": "-qk"}
+ANIMATION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "animation.py")
+DATA_ENV_VAR = "ANIMATION_DATA"
+# Must match animation.py
+LAUNCHED_AT_ENV_VAR = "ANIMATION_LAUNCHED_AT"
+STARTUP_FILE_ENV_VAR = "ANIMATION_STARTUP_FILE"
+
+# Upper bound on manim processes running at once across all render jobs
+MAX_RENDER_JOBS = int(os.environ.get("ANIMATION_MAX_RENDER_JOBS", str(max(1, min(4, os.cpu_count() or 1)))))
+_render_slots = threading.BoundedSemaphore(MAX_RENDER_JOBS)
+
+# Render in long-lived worker processes that import manim once, instead of
+# starting a manim process per scene; set to 0 to use the manim command line
+USE_RENDER_WORKER = os.environ.get("ANIMATION_RENDER_WORKER", "1").lower() not in ("0", "false", "no", "off")
+RENDER_WORKER_DIR = os.environ.get("ANIMATION_WORKER_DIR", os.path.join("media", "worker"))
+
+# Rendered videos are kept on disk and replayed for identical queries
+RENDER_CACHE = RenderCache(
+    os.environ.get("ANIMATION_CACHE_DIR", os.path.join("media", "render_cache")),
+    max_bytes=int(os.environ.get("ANIMATION_CACHE_MAX_MB", "500")) * 1024 * 1024,
+)
+
+def play_videos(paths: List[str]):
+    """Open videos with the system player, as manim's -p flag does"""
+    for path in paths:
+        try:
+            if sys.platform == "win32":
+                os.startfile(path)
+            elif sys.platform == "darwin":
+                subprocess.Popen(["open", path])
+            else:
+                subprocess.Popen(["xdg-open", path])
+        except OSError as e:
+            print(f"Error opening {path}: {e}")
+
+def _find_videos(media_dir: str, scenes: List[str]) -> Dict[str, str]:
+    """Locate the final video of each scene in a manim media directory"""
+    videos = {}
+    for scene in scenes:
+        matches = [
+            path for path in glob.glob(os.path.join(media_dir, "videos", "**", f"{scene}.mp4"), recursive=True)
+            if "partial_movie_files" not in path
+        ]
+        if matches:
+            videos[scene] = matches[0]
+    return videos
+
+def _record_startup(startup_file: str, scene: str):
+    """Report the startup time a traced manim process wrote, as span animation.manim_startup"""
+    try:
+        with open(startup_file) as f:
+            record("animation.manim_startup", json.load(f)["startup_ms"], scene=scene)
+    except (OSError, ValueError, KeyError):
+        pass
+
+def _render_scene(
+    scene: str,
+    flags: List[str],
+    data_path: str,
+    media_dir: str,
+    cancel_event: Optional[threading.Event],
+    abort: threading.Event
+) -> bool:
+    """Render one scene in its own manim process, holding a render slot while it runs"""
+    def cancelled():
+        return abort.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+    while not _render_slots.acquire(timeout=CANCEL_POLL_SECONDS):
+        if cancelled():
+            return False
+    try:
+        cmd = ["manim", *flags, "--media_dir", media_dir, ANIMATION_SCRIPT, scene]
+        env = {**os.environ, DATA_ENV_VAR: data_path}
+        startup_file = os.path.join(os.path.dirname(data_path), f"{scene}.startup.json")
+        if instrumentation_enabled():
+            # The child reports how long manim took to start, so it is timed apart from rendering
+            env.update({STARTUP_FILE_ENV_VAR: startup_file, LAUNCHED_AT_ENV_VAR: repr(time.time())})
+        with span("animation.manim", scene=scene) as timing:
+            try:
+                proc = subprocess.Popen(cmd, env=env)
+            except FileNotFoundError:
+                print("Error: Manim not found. Please install manim: pip install manim")
+                return False
+
+            while True:
+                try:
+                    returncode = proc.wait(timeout=CANCEL_POLL_SECONDS)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancelled():
+                        proc.terminate()
+                        proc.wait()
+                        timing.set(cancelled=True)
+                        return False
+            timing.set(returncode=returncode)
+        _record_startup(startup_file, scene)
+
+        if returncode != 0:
+            print(f"Error running animations: manim exited with status {returncode} rendering {scene}")
+            return False
+        return True
+    finally:
+        _render_slots.release()
+
 def run_animations(
     inputs: List[Tuple[str, np.ndarray]],
     ops: List[str],
     result: Tuple[str, np.ndarray],
-    similars: List[Tuple[str, np.ndarray, float]]
-):
+    similars: List[Tuple[str, np.ndarray, float]],
+    cancel_event: Optional[threading.Event] = None,
+    quality: str = "l",
+    preview: bool = True,
+    use_cache: bool = True
+) -> bool:
     """
     Launch Manim animations for vector operations and similarity comparison.
-    
+
     Args:
-        inputs: List of (word, vector) pairs representing input words
+        inputs: List of (word, vector) pairs representing input words, as 2D projections
         ops: List of operations like ["add", "sub"]
         result: Tuple of (result_word, result_vector)
         similars: List of (word, vector, similarity_score) for top similar words
+        cancel_event: Optional event; setting it terminates the render in progress
+        quality: Manim quality level, one of "l", "m", "h", "k"
+        preview: Play the videos once they are available
+        use_cache: Replay a previous render of identical data instead of running manim
+
+    Returns:
+        True if the render ran to completion (or was served from the cache)
     """
     # Prepare data for JSON file
-    data = {
-        "inputs":  [[w, v.tolist()] for w, v in inputs],
-        "ops":     ops,
-        "result":  [result[0], result[1].tolist()],
-        "similars":[[w, v.tolist(), s] for w, v, s in similars],
-    }
-    
-    # Write the data file beside animation.py
-    cfg_path = os.path.join("src", "animation_data.json")
-    with open(cfg_path, "w") as f:
-        json.dump(data, f)
-
-    # Now invoke manim with no custom flags needed
-    cmd = [
-        "manim", "-pql",
-        "src/animation.py",
-        "VectorOpsScene",
-        "SimilarityScene"
-    ]
-    
-    try:
-        # this will render VectorOpsScene, then SimilarityScene, in one subprocess
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running animations: {e}")
-    except FileNotFoundError:
-        print("Error: Manim not found. Please install manim: pip install manim")
+    with span("animation.serialize") as timing:
+        data = {
+            "inputs":  [[w, v.tolist()] for w, v in inputs],
+            "ops":     ops,
+            "result":  [result[0], result[1].tolist()],
+            "similars":[[w, v.tolist(), s] for w, v, s in similars],
+        }
+        payload = json.dumps(data)
+        timing.set(bytes=len(payload))
+    flags = [QUALITY_FLAGS[quality]]
+
+    key = render_key(data, flags)
+    if use_cache:
+        cached = RENDER_CACHE.get(key, SCENES)
+        if cached is not None:
+            if preview:
+                play_videos(list(cached.values()))
+            return True
+
+    with tempfile.TemporaryDirectory(prefix="manim-") as job_dir:
+        # Each job gets its own data file, handed to animation.py through the environment
+        data_path = os.path.join(job_dir, "animation_data.json")
+        with open(data_path, "w") as f:
+            f.write(payload)
+
+        # Render the scenes in parallel; if one fails the others are stopped
+        abort = threading.Event()
+        def cancelled():
+            return abort.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+        def render(scene):
+            media_dir = os.path.join(job_dir, scene)
+            if USE_RENDER_WORKER:
+                try:
+                    path = get_worker_pool(MAX_RENDER_JOBS, RENDER_WORKER_DIR).render(
+                        scene, data, quality, media_dir, cancelled, CANCEL_POLL_SECONDS
+                    )
+                    if path is None:
+                        abort.set()
+                    return path
+                except WorkerError as e:
+                    print(f"Render worker failed on {scene} ({e}); retrying with the manim command line")
+            if _render_scene(scene, flags, data_path, media_dir, cancel_event, abort):
+                return _find_videos(media_dir, [scene]).get(scene)
+            abort.set()
+            return None
+
+        with span("animation.render", quality=quality), ThreadPoolExecutor(max_workers=len(SCENES)) as pool:
+            paths = list(pool.map(render, SCENES))
+        if not all(paths):
+            return False
+
+        # Move the videos out of the temporary media dirs before they are removed
+        videos = RENDER_CACHE.put(key, dict(zip(SCENES, paths)))
+
+    if preview:
+        play_videos(list(videos.values()))
+    return True
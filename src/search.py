@@ -0,0 +1,156 @@
+from typing import Iterable, List, TYPE_CHECKING, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from instrumentation import count
+
+
+def _ensure_list(words):
+    if words is None:
+        return []
+    if isinstance(words, str):
+        return [words]
+    return list(words)
+
+
+def gather_inputs(embeddings: "KeyedVectors", positive=None, negative=None):
+    """
+    Gather the rows of all input words with one fancy-indexing call.
+
+    Returns (indices, weights, rows, query): the input row indices, their +1/-1
+    weights, the raw float32 rows and the unit query vector `KeyedVectors.most_similar`
+    builds (mean of the weighted unit rows, normalized). Unknown words raise `KeyError`.
+    """
+    positive = _ensure_list(positive)
+    negative = _ensure_list(negative)
+    indices = np.asarray([embeddings.get_index(word) for word in positive + negative], dtype=np.int64)
+    weights = np.concatenate((np.ones(len(positive)), -np.ones(len(negative)))).astype(np.float32)
+    if not len(indices):
+        raise ValueError("Cannot compute similarity with no input")
+
+    embeddings.fill_norms()
+    rows = np.asarray(embeddings.vectors[indices], dtype=np.float32)
+    query = weights @ (rows / embeddings.norms[indices, None])
+    norm = np.linalg.norm(query)
+    if norm > 0:
+        query = query / norm
+    return indices, weights, rows, query.astype(np.float32)
+
+
+def query_vector(embeddings: "KeyedVectors", positive=None, negative=None) -> Tuple[np.ndarray, List[int]]:
+    """
+    Build the unit query vector used by `KeyedVectors.most_similar`.
+
+    Returns the query together with the row indices of the input words, which are
+    excluded from the results.
+    """
+    indices, _, _, query = gather_inputs(embeddings, positive, negative)
+    return query, indices.tolist()
+
+
+def query_matrix(embeddings: "KeyedVectors", terms: List[Tuple[List[str], List[str]]]):
+    """
+    Build one unit query row per (positives, negatives) pair, as `query_vector` does,
+    with a single gather of all input rows.
+
+    Returns the (len(terms) x dim) query matrix plus the (row, column) pairs of every
+    input word, so callers can mask the inputs out of a score matrix.
+    """
+    rows, cols, weights = [], [], []
+    for row, (positives, negatives) in enumerate(terms):
+        for word, weight in [(w, 1.0) for w in positives] + [(w, -1.0) for w in negatives]:
+            rows.append(row)
+            cols.append(embeddings.get_index(word))
+            weights.append(weight)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    embeddings.fill_norms()
+    unit = embeddings.vectors[cols] / embeddings.norms[cols, None]
+    queries = np.zeros((len(terms), embeddings.vector_size), dtype=np.float32)
+    np.add.at(queries, rows, unit * np.asarray(weights, dtype=np.float32)[:, None])
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries /= np.where(norms > 0, norms, 1)
+    return queries, rows, cols
+
+
+def top_k(scores: np.ndarray, topn: int, exclude: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the `topn` highest scores, best first, skipping `exclude`."""
+    exclude = set(exclude)
+    k = min(len(scores), topn + len(exclude))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind="stable")]
+    best = np.array([i for i in best if i not in exclude][:topn], dtype=np.int64)
+    return best, scores[best]
+
+
+class SearchEngine:
+    """
+    Base class for similarity search engines over a `KeyedVectors` model.
+
+    Subclasses implement `search`; `most_similar` mirrors the call signature and the
+    positive/negative semantics of `KeyedVectors.most_similar`, so an engine can be
+    used anywhere the embeddings themselves were queried. `full` asks for the whole
+    vocabulary to be searched; only engines that may skip part of it (`TieredSearch`)
+    look at it.
+    """
+
+    def __init__(self, embeddings: "KeyedVectors"):
+        self.embeddings = embeddings
+
+    def search(self, query: np.ndarray, topn: int, exclude: Iterable[int] = (),
+               full: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def most_similar(self, positive=None, negative=None, topn=10, full=False) -> List[Tuple[str, float]]:
+        query, exclude = query_vector(self.embeddings, positive, negative)
+        indices, scores = self.search(query, topn, exclude, full)
+        return [(self.embeddings.index_to_key[i], float(s)) for i, s in zip(indices, scores)]
+
+
+class ExactSearch(SearchEngine):
+    """Brute-force cosine similarity against every row, as `most_similar` does."""
+
+    def search(self, query, topn, exclude=(), full=False):
+        self.embeddings.fill_norms()
+        scores = self.embeddings.vectors @ query
+        scores /= self.embeddings.norms
+        return top_k(scores, topn, exclude)
+
+
+def run_query(engine: SearchEngine, positive=None, negative=None, topn: int = 5, neighbours=None,
+              full: bool = False) -> dict:
+    """
+    Answer one query with a single pass over its data.
+
+    The input rows are gathered once and give both the unit search query and the raw
+    ``result_vector`` (sum of positive minus negative vectors) shown in the animation;
+    the similar words' vectors come from one more gather. Returns every array the UI
+    and `run_animations` need: ``words``, ``input_vectors``, ``result_vector``,
+    ``indices``, ``scores``, ``similar_words`` and ``similar_vectors``.
+
+    Single-word queries are read from the precomputed `neighbours` table when given
+    and the word is in it; everything else goes to `engine`, with `full` asking it to
+    search the whole vocabulary.
+    """
+    embeddings = engine.embeddings
+    words = _ensure_list(positive) + _ensure_list(negative)
+    indices, weights, rows, query = gather_inputs(embeddings, positive, negative)
+    found = None
+    if neighbours is not None and len(indices) == 1 and weights[0] > 0:
+        found = neighbours.lookup(int(indices[0]), topn)
+        count("neighbour_table.hit" if found is not None else "neighbour_table.miss")
+    top, scores = found if found is not None else engine.search(query, topn, indices.tolist(), full)
+    return {
+        "words": words,
+        "input_vectors": rows,
+        "result_vector": weights.astype(np.float64) @ rows,
+        "indices": top,
+        "scores": scores,
+        "similar_words": [embeddings.index_to_key[i] for i in top],
+        "similar_vectors": np.asarray(embeddings.vectors[top], dtype=np.float32),
+    }
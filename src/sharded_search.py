@@ -0,0 +1,87 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import load_static_embeddings
+from search import SearchEngine, top_k
+
+
+class ShardedSearch(SearchEngine):
+    """
+    Exact search split across row shards scored in a thread pool.
+
+    Each shard computes its slice of the cosine scores and keeps only its own top
+    ``topn + len(exclude)`` rows; the shard winners are merged into the global top-k.
+    NumPy releases the GIL inside the matrix-vector products and `argpartition`, so
+    the shards run on separate cores. Results equal `KeyedVectors.most_similar`.
+    """
+
+    def __init__(self, embeddings: "KeyedVectors", workers: Optional[int] = None, n_shards: Optional[int] = None):
+        super().__init__(embeddings)
+        self.workers = workers or os.cpu_count() or 1
+        n_shards = n_shards or self.workers
+        bounds = np.linspace(0, len(embeddings.vectors), n_shards + 1).astype(np.int64)
+        self.shards = [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shard")
+
+    def _search_shard(self, shard, query, k):
+        start, end = shard
+        scores = self.embeddings.vectors[start:end] @ query
+        scores /= self.embeddings.norms[start:end]
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        return best + start, scores[best]
+
+    def search(self, query, topn, exclude=(), full=False):
+        exclude = list(exclude)
+        self.embeddings.fill_norms()
+        k = topn + len(exclude)
+        results = list(self._pool.map(lambda shard: self._search_shard(shard, query, k), self.shards))
+        candidates = np.concatenate([indices for indices, _ in results])
+        scores = np.concatenate([scores for _, scores in results])
+        # Order candidates by row so equal scores break ties the way a single pass would
+        order = np.argsort(candidates, kind="stable")
+        candidates, scores = candidates[order], scores[order]
+        best, best_scores = top_k(scores, topn, np.flatnonzero(np.isin(candidates, exclude)))
+        return candidates[best], best_scores
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check sharded exact search against most_similar and time it.")
+    parser.add_argument("file_path")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    embeddings = load_static_embeddings(args.file_path, binary=not args.text, no_header=args.no_header)
+    rng = np.random.default_rng(0)
+    pool = min(len(embeddings.index_to_key), 50000)
+    queries = [[embeddings.index_to_key[i]] for i in rng.choice(pool, min(pool, args.queries), replace=False)]
+
+    start = time.perf_counter()
+    expected = [embeddings.most_similar(positive=words, topn=5) for words in queries]
+    print(f"most_similar: {1000 * (time.perf_counter() - start) / len(queries):.2f} ms/query")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        engine = ShardedSearch(embeddings, workers=workers)
+        start = time.perf_counter()
+        found = [engine.most_similar(positive=words, topn=5) for words in queries]
+        elapsed = 1000 * (time.perf_counter() - start) / len(queries)
+        mismatches = sum([w for w, _ in a] != [w for w, _ in b] for a, b in zip(expected, found))
+        print(f"{workers:>3} workers: {elapsed:.2f} ms/query, {mismatches} mismatches")
+        engine.close()
+        workers *= 2
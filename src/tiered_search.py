@@ -0,0 +1,84 @@
+import argparse
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import load_static_embeddings
+from instrumentation import count
+from search import SearchEngine, top_k
+
+
+class TieredSearch(SearchEngine):
+    """
+    Exact search that scores the frequent words first and the long tail on demand.
+
+    Rows are in frequency order, so the first `head_size` rows are the frequent tier.
+    A query scans only the head unless it asks for `full` results, one of its input
+    words lives in the tail (a rare word tends to have rare neighbours), or its
+    `topn`-th best head score falls below `tail_threshold`. The tail stays reachable
+    but, being memory-mapped, is only paged in for the queries that need it.
+    """
+
+    def __init__(self, embeddings: "KeyedVectors", head_size: int = 200000, tail_threshold: float = 0.5):
+        super().__init__(embeddings)
+        self.head_size = min(head_size, len(embeddings.vectors))
+        self.tail_threshold = tail_threshold
+
+    def _score(self, start, end, query):
+        scores = self.embeddings.vectors[start:end] @ query
+        scores /= self.embeddings.norms[start:end]
+        return scores
+
+    def search(self, query, topn, exclude=(), full=False):
+        exclude = list(exclude)
+        self.embeddings.fill_norms()
+        head = self._score(0, self.head_size, query)
+        best, best_scores = top_k(head, topn, [i for i in exclude if i < self.head_size])
+        needs_tail = (
+            full
+            or any(i >= self.head_size for i in exclude)
+            or len(best) < topn
+            or best_scores[-1] < self.tail_threshold
+        )
+        if not needs_tail or self.head_size == len(self.embeddings.vectors):
+            count("tiered_search.head")
+            return best, best_scores
+
+        count("tiered_search.tail")
+        tail = self._score(self.head_size, len(self.embeddings.vectors), query)
+        tail_best, tail_scores = top_k(tail, topn, [i - self.head_size for i in exclude if i >= self.head_size])
+        # Head candidates come first, so equal scores still break ties by row
+        candidates = np.concatenate((best, tail_best + self.head_size))
+        scores = np.concatenate((best_scores, tail_scores))
+        merged, merged_scores = top_k(scores, topn)
+        return candidates[merged], merged_scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare tiered search with a full scan.")
+    parser.add_argument("file_path")
+    parser.add_argument("--text", action="store_true", help="embeddings file is in text format")
+    parser.add_argument("--no-header", action="store_true")
+    parser.add_argument("--head-size", type=int, default=200000)
+    parser.add_argument("--tail-threshold", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = load_static_embeddings(args.file_path, binary=not args.text, no_header=args.no_header)
+    engine = TieredSearch(embeddings, args.head_size, args.tail_threshold)
+    rng = np.random.default_rng(0)
+    pool = min(len(embeddings.index_to_key), args.head_size)
+    queries = [[embeddings.index_to_key[i]] for i in rng.choice(pool, min(pool, args.queries), replace=False)]
+
+    start = time.perf_counter()
+    expected = [embeddings.most_similar(positive=words, topn=5) for words in queries]
+    print(f"most_similar: {1000 * (time.perf_counter() - start) / len(queries):.2f} ms/query")
+    start = time.perf_counter()
+    found = [engine.most_similar(positive=words, topn=5) for words in queries]
+    print(f"tiered:       {1000 * (time.perf_counter() - start) / len(queries):.2f} ms/query")
+    agree = sum(len({w for w, _ in a} & {w for w, _ in b}) for a, b in zip(expected, found))
+    print(f"overlap with the full scan: {agree / (5 * len(queries)):.3f}")
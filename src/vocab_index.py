@@ -0,0 +1,101 @@
+import bisect
+import os
+from typing import List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from gensim.models import KeyedVectors
+
+from embeddings_loader import cache_path, cache_stamp, temp_path
+
+
+class PrefixIndex:
+    """
+    Sorted, array-packed vocabulary for autocomplete and membership checks.
+
+    Words are stored UTF-8 encoded, in byte order, back to back in one ``uint8`` blob
+    with an ``offsets`` array marking where each begins; ``ranks`` holds each word's
+    row in the embeddings (lower means more frequent). Lookups binary-search the blob,
+    so they never scan the vocabulary.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, ranks: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.ranks = ranks
+
+    @classmethod
+    def build(cls, words: List[str]) -> "PrefixIndex":
+        encoded = [word.encode("utf-8") for word in words]
+        order = sorted(range(len(encoded)), key=encoded.__getitem__)
+        lengths = np.fromiter((len(encoded[i]) for i in order), dtype=np.int64, count=len(order))
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded[i] for i in order), dtype=np.uint8)
+        return cls(blob, offsets, np.asarray(order, dtype=np.int32))
+
+    def save(self, path, stamp: str = ""):
+        tmp_path = temp_path(path)
+        np.savez(tmp_path, blob=self.blob, offsets=self.offsets, ranks=self.ranks, stamp=np.array(stamp))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, stamp: Optional[str] = None) -> "PrefixIndex":
+        """Load a saved index; raises `ValueError` if it was built from other vectors than `stamp`"""
+        with np.load(path) as data:
+            if stamp is not None and ("stamp" not in data.files or str(data["stamp"]) != stamp):
+                raise ValueError(f"Prefix index {path} was built from a different embeddings file")
+            return cls(data["blob"], data["offsets"], data["ranks"])
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def __getitem__(self, i) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def __contains__(self, word: str) -> bool:
+        key = word.encode("utf-8")
+        i = bisect.bisect_left(self, key)
+        return i < len(self) and self[i] == key
+
+    def prefix_range(self, prefix: str):
+        """Half-open range of sorted positions whose words start with `prefix`"""
+        key = prefix.encode("utf-8")
+        # 0xFF never occurs in UTF-8, so it sorts after every continuation of the prefix
+        return bisect.bisect_left(self, key), bisect.bisect_left(self, key + b"\xff")
+
+    def complete(self, prefix: str, limit: int = 5) -> List[str]:
+        """The `limit` most frequent words starting with `prefix`, most frequent first"""
+        lo, hi = self.prefix_range(prefix)
+        if lo >= hi or limit <= 0:
+            return []
+        ranks = self.ranks[lo:hi]
+        if len(ranks) > limit:
+            best = np.argpartition(ranks, limit - 1)[:limit]
+        else:
+            best = np.arange(len(ranks))
+        best = best[np.argsort(ranks[best])]
+        return [self[lo + i].decode("utf-8") for i in best]
+
+
+def load_prefix_index(embeddings: "KeyedVectors", file_path, variant: Optional[str] = None) -> PrefixIndex:
+    """
+    Return the prefix index cached with the embeddings, building it on first use;
+    `variant` tags the file of a restricted vocabulary (see `vocabulary_variant`)
+    """
+    path = cache_path(file_path, "prefix.npz", variant)
+    stamp = cache_stamp(file_path)
+    try:
+        index = PrefixIndex.load(path, stamp)
+        if len(index) == len(embeddings.index_to_key):
+            return index
+    except Exception:
+        # Missing, stale or damaged (e.g. a half-written file from an older version)
+        pass
+    index = PrefixIndex.build(embeddings.index_to_key)
+    try:
+        index.save(path, stamp)
+    except OSError as e:
+        print(f"Error saving prefix index: {e}")
+    return index